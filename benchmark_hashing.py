@@ -0,0 +1,22 @@
+"""
+Times building and structurally hashing generated trails of growing size.
+
+Hashing visits every node once, so the time per node should stay flat as trails grow.
+
+    python benchmark_hashing.py [number of mountains ...]
+"""
+from __future__ import annotations
+
+import sys
+
+from benchmark_stores import generate_trail, timed
+
+def benchmark(sizes: list[int]) -> None:
+    print(f"{'mountains':>10}{'build (s)':>11}{'hash (s)':>10}{'hash (us/mountain)':>20}")
+    for mountains in sizes:
+        trail, build_time = timed(generate_trail, mountains)
+        _, hash_time = timed(trail.structural_hash)
+        print(f"{mountains:>10}{build_time:>11.3f}{hash_time:>10.3f}{hash_time / mountains * 1e6:>20.2f}")
+
+if __name__ == "__main__":
+    benchmark(list(map(int, sys.argv[1:] or ["5000", "10000", "20000", "40000", "100000"])))
@@ -0,0 +1,61 @@
+"""
+Compares store file formats and codecs on generated trails.
+
+For every format (.json, .trail) and codec (none, gzip, bz2, lzma) this saves a generated trail,
+then reports the file size and the time taken to save and load it.
+
+    python benchmark_stores.py [number of mountains ...]
+"""
+from __future__ import annotations
+
+import os
+import random
+import sys
+import tempfile
+import time
+
+from mountain import Mountain
+from serialize import CODECS, load_store, save_store
+from trail import Trail, TrailSeries, TrailSplit
+
+def generate_trail(mountains: int, seed: int = 0) -> Trail:
+    """
+    Returns a trail of roughly the given number of mountains, drawn from a pool of repeated names,
+    with a split about every five mountains.
+
+    :complexity: O(m), where m is the number of mountains
+    """
+    rng = random.Random(seed)
+    trail = Trail(None)
+    for i in range(mountains):
+        mountain = Mountain(f"mountain-{rng.randrange(200)}", rng.randrange(10), rng.randrange(1, 20))
+        if i % 5 == 0:
+            branch = Trail(TrailSeries(mountain, Trail(None)))
+            trail = Trail(TrailSplit(branch, Trail(None), trail))
+        else:
+            trail = Trail(TrailSeries(mountain, trail))
+    return trail
+
+def timed(f, *args):
+    start = time.perf_counter()
+    result = f(*args)
+    return result, time.perf_counter() - start
+
+def benchmark(mountains: int) -> None:
+    trail = generate_trail(mountains)
+    print(f"{mountains} mountains")
+    print(f"{'file':<14}{'size (bytes)':>14}{'save (s)':>10}{'load (s)':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        for store in (".json", ".trail"):
+            for codec in (None,) + tuple(CODECS):
+                name = "store" + store + ("" if codec is None else CODECS[codec][2][0])
+                path = os.path.join(directory, name)
+                _, save_time = timed(save_store, trail, path)
+                loaded, load_time = timed(load_store, path)
+                assert loaded == trail
+                print(f"{name:<14}{os.path.getsize(path):>14}{save_time:>10.3f}{load_time:>10.3f}")
+    print()
+
+if __name__ == "__main__":
+    for mountains in map(int, sys.argv[1:] or ["1000", "20000"]):
+        benchmark(mountains)
@@ -0,0 +1,365 @@
+"""
+Binary .trail store format.
+
+    header      MAGIC, then a version byte
+    mountains   varint count, then each distinct mountain as its name (varint byte length and UTF-8 bytes),
+                zigzag varint difficulty_level and zigzag varint length
+    root        the record of the root trail
+
+Trail records are written in pre-order:
+
+    EMPTY_TAG
+    SERIES_TAG  varint index into the mountain table, following record
+    SPLIT_TAG   varint size of the top record, varint size of the bottom record, top, bottom and follow records
+
+Split records carry the sizes of their branches, so a reader can jump over a branch without
+decoding it. TrailReader walks any part of a file (or memory map) this way, decoding only the
+records it is asked for.
+
+Version 1 files, which have a table of names and keep the difficulty_level and length in each
+series record, can still be read.
+"""
+from __future__ import annotations
+
+import io
+import mmap
+from typing import BinaryIO, Union
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+from trail_factory import TrailFactory
+
+MAGIC = b"TRAIL"
+VERSION = 2
+
+EMPTY_TAG = 0
+SERIES_TAG = 1
+SPLIT_TAG = 2
+
+Buffer = Union[bytes, bytearray, mmap.mmap]
+
+def _varint(n: int) -> bytes:
+    """Encodes a non-negative int, 7 bits per byte, least significant first."""
+    out = bytearray()
+    while n > 0x7f:
+        out.append(n & 0x7f | 0x80)
+        n >>= 7
+    out.append(n)
+    return bytes(out)
+
+def _zigzag(n: int) -> int:
+    """Maps ints to non-negative ints, small magnitudes first: 0, -1, 1, -2, ... -> 0, 1, 2, 3, ..."""
+    return n << 1 if n >= 0 else (-n << 1) - 1
+
+def _read_varint(data: Buffer, pos: int) -> tuple[int, int]:
+    """Decodes the varint at pos, returning it and the position after it."""
+    n = shift = 0
+    while True:
+        byte = data[pos]
+        pos += 1
+        n |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return n, pos
+        shift += 7
+
+def _read_zigzag(data: Buffer, pos: int) -> tuple[int, int]:
+    z, pos = _read_varint(data, pos)
+    return z >> 1 ^ -(z & 1), pos
+
+def write_binary(trail: Trail, f: BinaryIO) -> None:
+    """
+    Writes the trail to a binary file in the .trail format.
+
+    The first pass finds every record's size bottom up, the second writes records top down,
+    both with explicit stacks.
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    # (name, difficulty_level, length) -> index in the mountain table
+    mountains = {}
+    # id(store) -> (record up to its children, size of the whole record)
+    records = {}
+    stack = [trail.store] if trail.store is not None else []
+    while stack:
+        store = stack[-1]
+        if id(store) in records:
+            stack.pop()
+            continue
+        if isinstance(store, TrailSeries):
+            children = [store.following]
+        elif isinstance(store, TrailSplit):
+            children = [store.path_top, store.path_bottom, store.path_follow]
+        else:
+            raise ValueError("Invalid TrailStore")
+        missing = [child.store for child in children if child.store is not None and id(child.store) not in records]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        sizes = [1 if child.store is None else records[id(child.store)][1] for child in children]
+        if isinstance(store, TrailSeries):
+            mountain = store.mountain
+            index = mountains.setdefault((mountain.name, mountain.difficulty_level, mountain.length), len(mountains))
+            head = bytes([SERIES_TAG]) + _varint(index)
+        else:
+            head = bytes([SPLIT_TAG]) + _varint(sizes[0]) + _varint(sizes[1])
+        records[id(store)] = (head, len(head) + sum(sizes))
+
+    out = bytearray(MAGIC)
+    out.append(VERSION)
+    out += _varint(len(mountains))
+    for name, difficulty_level, length in mountains:
+        encoded = name.encode()
+        out += _varint(len(encoded))
+        out += encoded
+        out += _varint(_zigzag(difficulty_level))
+        out += _varint(_zigzag(length))
+
+    stack = [trail]
+    while stack:
+        store = stack.pop().store
+        if store is None:
+            out.append(EMPTY_TAG)
+        else:
+            out += records[id(store)][0]
+            if isinstance(store, TrailSeries):
+                stack.append(store.following)
+            else:
+                stack.extend((store.path_follow, store.path_bottom, store.path_top))
+        if len(out) >= 1 << 16:
+            f.write(out)
+            out.clear()
+    f.write(out)
+
+def encode(trail: Trail) -> bytes:
+    """
+    Returns the trail in the .trail format.
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    out = io.BytesIO()
+    write_binary(trail, out)
+    return out.getvalue()
+
+class TrailReader:
+    """
+    Reads records from a .trail file held in a buffer, such as a memory map, without decoding
+    the rest of the file. Records are addressed by their offset in the buffer.
+
+    If a factory is given, mountains are made by factory.mountain, so every series holding the same
+    mountain shares one object, as do readers given the same factory. Otherwise every series
+    gets its own Mountain, so editing one leaves the others alone.
+    """
+
+    def __init__(self, data: Buffer, factory: TrailFactory|None = None) -> None:
+        """
+        Reads the header and mountain table.
+
+        :raises ValueError: if data is not a .trail file
+
+        :complexity: O(m), where m is the size of the mountain table
+        """
+        header = bytes(data[:len(MAGIC) + 1])
+        if header[:-1] != MAGIC or len(header) <= len(MAGIC):
+            raise ValueError("Invalid trail file")
+        if header[-1] not in (1, VERSION):
+            raise ValueError(f"Unsupported trail file version {header[-1]}")
+        self.data = data
+        self.version = header[-1]
+        self.mountain = Mountain if factory is None else factory.mountain
+        try:
+            count, pos = _read_varint(data, len(MAGIC) + 1)
+            # Names in version 1, (name, difficulty_level, length) since.
+            self.table = []
+            for _ in range(count):
+                size, pos = _read_varint(data, pos)
+                name = bytes(data[pos:pos + size]).decode()
+                pos += size
+                if self.version == 1:
+                    self.table.append(name)
+                    continue
+                difficulty_level, pos = _read_zigzag(data, pos)
+                length, pos = _read_zigzag(data, pos)
+                self.table.append((name, difficulty_level, length))
+        except (IndexError, UnicodeDecodeError):
+            raise ValueError("Invalid trail file")
+        self.root = pos
+
+    def record(self, offset: int) -> tuple:
+        """
+        Decodes the record at offset, returning one of
+            (EMPTY_TAG,)
+            (SERIES_TAG, mountain, offset of following)
+            (SPLIT_TAG, offset of top, offset of bottom, offset of follow)
+
+        :raises ValueError: if there is no valid record at offset
+
+        :complexity: O(1)
+        """
+        data = self.data
+        try:
+            tag = data[offset]
+            if tag == EMPTY_TAG:
+                return (EMPTY_TAG,)
+            elif tag == SERIES_TAG:
+                index, pos = _read_varint(data, offset + 1)
+                if self.version == 1:
+                    difficulty_level, pos = _read_zigzag(data, pos)
+                    length, pos = _read_zigzag(data, pos)
+                    return (SERIES_TAG, self.mountain(self.table[index], difficulty_level, length), pos)
+                return (SERIES_TAG, self.mountain(*self.table[index]), pos)
+            elif tag == SPLIT_TAG:
+                top_size, pos = _read_varint(data, offset + 1)
+                bottom_size, pos = _read_varint(data, pos)
+                return (SPLIT_TAG, pos, pos + top_size, pos + top_size + bottom_size)
+        except IndexError:
+            pass
+        raise ValueError("Invalid trail file")
+
+    def trail(self, offset: int|None = None) -> Trail:
+        """
+        Decodes the trail whose record is at offset (the root if None).
+
+        :raises ValueError: if the records are invalid
+
+        :complexity: O(n), where n is the number of nodes in the trail
+        """
+        pos = self.root if offset is None else offset
+        # Each frame is [record, children decoded so far]; a series needs 1 child, a split 3.
+        frames = []
+        while True:
+            record = self.record(pos)
+            if record[0] == SERIES_TAG:
+                frames.append((record, []))
+                pos = record[2]
+                continue
+            if record[0] == SPLIT_TAG:
+                frames.append((record, []))
+                pos = record[1]
+                continue
+            trail = Trail(None)
+            while frames:
+                record, children = frames[-1]
+                children.append(trail)
+                if record[0] == SERIES_TAG:
+                    trail = Trail(TrailSeries(record[1], children[0]))
+                elif len(children) == 3:
+                    trail = Trail(TrailSplit(*children))
+                else:
+                    pos = record[1 + len(children)]
+                    break
+                frames.pop()
+            else:
+                return trail
+
+class LazyTrail(Trail):
+    """
+    A Trail in a .trail file, whose store is decoded from its record the first time it is read,
+    with LazyTrails for its children. Reading or assigning store turns it into a plain Trail,
+    so walks, drawing and edits behave as they would on a fully loaded trail, while branches
+    that are never visited are never decoded.
+    """
+
+    def __init__(self, reader: TrailReader, offset: int) -> None:
+        object.__setattr__(self, "_reader", reader)
+        object.__setattr__(self, "_offset", offset)
+
+    @property
+    def store(self) -> TrailStore:
+        """
+        :complexity: O(1)
+        """
+        state = self.__dict__
+        reader = state.get("_reader")
+        if reader is not None:
+            record = reader.record(state["_offset"])
+            if record[0] == SERIES_TAG:
+                store = TrailSeries(record[1], LazyTrail(reader, record[2]))
+            elif record[0] == SPLIT_TAG:
+                store = TrailSplit(*(LazyTrail(reader, offset) for offset in record[1:]))
+            else:
+                store = None
+            # Another thread may have decoded it meanwhile; keep whichever came first.
+            state.setdefault("store", store)
+            state.pop("_reader", None)
+            state.pop("_offset", None)
+        self.__class__ = Trail
+        return state["store"]
+
+    @store.setter
+    def store(self, value: TrailStore) -> None:
+        self.__dict__["store"] = value
+
+    def __setattr__(self, name: str, value) -> None:
+        if name == "store":
+            # Decode first, so the edit is seen as an edit rather than initialisation.
+            self.store
+        Trail.__setattr__(self, name, value)
+
+    def __eq__(self, other: object) -> bool:
+        self.store
+        return Trail.__eq__(self, other)
+
+    def __getstate__(self) -> dict:
+        self.store
+        return Trail.__getstate__(self)
+
+def decode(data: Buffer, factory: TrailFactory|None = None) -> Trail:
+    """
+    Decodes a whole .trail file. If a factory is given, the trail is interned in it too,
+    so identical sub-trails become one shared object.
+
+    :raises ValueError: if data is not a .trail file
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    trail = TrailReader(data, factory).trail()
+    if factory is not None:
+        return factory.intern(trail)
+    return trail
+
+def load_binary(path: str, factory: TrailFactory|None = None) -> Trail:
+    """
+    Loads a .trail file through a read-only memory map (see decode).
+
+    :raises ValueError: if the file is not a .trail file
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped.
+            raise ValueError("Invalid trail file")
+        with data:
+            return decode(data, factory)
+
+def decode_lazy(data: Buffer, factory: TrailFactory|None = None) -> Trail:
+    """
+    Returns a LazyTrail for the root of a .trail file held in a buffer.
+    Mountains are made by factory.mountain if given (see TrailReader).
+
+    :raises ValueError: if data is not a .trail file
+
+    :complexity: O(m), where m is the size of the mountain table
+    """
+    reader = TrailReader(data, factory)
+    return LazyTrail(reader, reader.root)
+
+def load_lazy(path: str, factory: TrailFactory|None = None) -> Trail:
+    """
+    Opens a .trail file through a read-only memory map, returning a LazyTrail for its root.
+    Records are decoded as the trail is explored; the map is closed once nothing refers to it.
+    Mountains are made by factory.mountain if given (see TrailReader).
+
+    :raises ValueError: if the file is not a .trail file
+
+    :complexity: O(m), where m is the size of the mountain table
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError("Invalid trail file")
+    return decode_lazy(data, factory)
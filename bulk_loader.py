@@ -0,0 +1,106 @@
+"""
+Builds one MountainManager from every store file in a directory, loading the files on a process pool.
+
+Workers send back the mountains of each file as a MountainBatch, a few flat columns, rather than
+pickled Trail graphs, and the parent turns the batches into Mountains as it merges them.
+"""
+from __future__ import annotations
+
+import os
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+from mountain import Mountain
+from mountain_manager import MountainManager
+from serialize import CODECS
+from trail_factory import TrailFactory
+from trail_journal import load_journaled
+
+STORE_EXTENSIONS = tuple(
+    store + compressed
+    for store in (".json", ".trail")
+    for compressed in ("",) + tuple(ext for _, _, exts in CODECS.values() for ext in exts)
+)
+
+@dataclass
+class MountainBatch:
+    """The mountains of one store file, in trail order, as columns."""
+
+    path: str
+    names: list[str]
+    difficulty_levels: array
+    lengths: array
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def mountains(self, factory: TrailFactory|None = None) -> list[Mountain]:
+        """
+        Returns the mountains, made by factory.mountain if given so equal mountains are shared.
+
+        :complexity: O(m), where m is the number of mountains
+        """
+        make = Mountain if factory is None else factory.mountain
+        return [make(*row) for row in zip(self.names, self.difficulty_levels, self.lengths)]
+
+def load_batch(path: str) -> MountainBatch:
+    """
+    Loads a store file (replaying its journal, see trail_journal) and returns its mountains as a batch.
+    The store's files are only read, so stores can be loaded while a writer, such as the GUI, compacts them;
+    a store whose snapshot is replaced during the load is read again.
+
+    :raises ValueError: if the file is not a trail
+
+    :complexity: O(n), where n is the size of the file
+    """
+    names, difficulty_levels, lengths = [], array("q"), array("q")
+    for mountain in load_journaled(path).iter_mountains():
+        names.append(mountain.name)
+        difficulty_levels.append(mountain.difficulty_level)
+        lengths.append(mountain.length)
+    return MountainBatch(path, names, difficulty_levels, lengths)
+
+def store_paths(directory: str) -> list[str]:
+    """
+    Returns the store files in a directory, sorted by name, skipping hidden files
+    (such as a snapshot being compacted).
+
+    :complexity: O(f*log(f)), where f is the number of files in the directory
+    """
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith(STORE_EXTENSIONS) and not name.startswith(".")
+    )
+
+def load_directory(directory: str = "stores", manager: MountainManager|None = None, workers: int|None = None,
+                   factory: TrailFactory|None = None) -> MountainManager:
+    """
+    Adds the mountains of every store file in directory to a MountainManager (a new one if not given),
+    file by file in name order, and returns it. Each mountain is a separate Mountain, unless factory
+    is given, in which case equal mountains become the one shared Mountain made by factory.mountain.
+
+    Files are loaded on a pool of worker processes (one per CPU if workers is None);
+    with a single worker or file they are loaded in this process.
+
+    :raises ValueError: if a file is not a trail
+
+    :complexity: O(n/w + m), where n is the total size of the files, w the number of workers
+                 and m the number of mountains
+    """
+    if manager is None:
+        manager = MountainManager()
+    paths = store_paths(directory)
+    workers = min(workers or os.cpu_count() or 1, len(paths))
+    if workers <= 1:
+        return _merge(manager, map(load_batch, paths), factory)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        # Hand out several files at a time, so small files are not dominated by the round trips.
+        chunksize = max(1, len(paths) // (4 * workers))
+        return _merge(manager, pool.map(load_batch, paths, chunksize=chunksize), factory)
+
+def _merge(manager: MountainManager, batches, factory: TrailFactory|None) -> MountainManager:
+    for batch in batches:
+        for mountain in batch.mountains(factory):
+            manager.add_mountain(mountain)
+    return manager
@@ -0,0 +1,216 @@
+"""
+Array-backed snapshot of a Trail, for walk-heavy batch jobs.
+
+Walking a Trail chases Trail -> TrailSeries/TrailSplit -> Trail objects and checks
+isinstance at every hop. A CompiledTrail flattens the same structure into parallel
+typed arrays, so the hot loops only index into arrays.
+"""
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+
+if TYPE_CHECKING:
+    from personality import WalkerPersonality
+
+# Node kinds
+SERIES = 0
+SPLIT = 1
+
+# Child offset used for an empty trail
+EMPTY = -1
+
+class CompiledTrail:
+    """
+    A Trail flattened into parallel arrays, one entry per TrailSeries/TrailSplit.
+
+    For node i:
+        kind[i]         SERIES or SPLIT
+        mountain[i]     index into self.mountains (EMPTY for splits)
+        following[i]    node after the mountain (EMPTY for splits)
+        path_top[i], path_bottom[i], path_follow[i]
+                        branch nodes (EMPTY for series)
+
+    Child offsets are node indices, or EMPTY for an empty trail. Nodes are numbered in
+    pre-order (top, bottom, follow), so the start of the trail is node 0. Subtrees shared
+    between several places in the Trail are compiled once.
+
+    The compiled trail is a snapshot, later edits to the Trail are not reflected in it.
+    """
+
+    def __init__(self, trail: Trail) -> None:
+        """
+        Compiles the trail.
+
+        :complexity: O(n), where n is the number of nodes in the trail
+        """
+        # Pre-order numbering of the distinct stores.
+        order = []
+        node_of = {}
+        stack = [trail.store]
+        while stack:
+            store = stack.pop()
+            if store is None or id(store) in node_of:
+                continue
+            node_of[id(store)] = len(order)
+            order.append(store)
+            if isinstance(store, TrailSeries):
+                stack.append(store.following.store)
+            elif isinstance(store, TrailSplit):
+                stack.append(store.path_follow.store)
+                stack.append(store.path_bottom.store)
+                stack.append(store.path_top.store)
+            else:
+                raise ValueError("Invalid TrailStore")
+
+        def offset(child: Trail) -> int:
+            return EMPTY if child.store is None else node_of[id(child.store)]
+
+        n = len(order)
+        self.kind = array("b", bytes(n))
+        self.mountain = array("i", [EMPTY]) * n
+        self.following = array("i", [EMPTY]) * n
+        self.path_top = array("i", [EMPTY]) * n
+        self.path_bottom = array("i", [EMPTY]) * n
+        self.path_follow = array("i", [EMPTY]) * n
+        self.mountains: list[Mountain] = []
+        # The original stores, by node.
+        self.stores: list[TrailSeries|TrailSplit] = order
+        # select_branch is handed the original branch trails.
+        self.branch_trails: dict[int, tuple[Trail, Trail]] = {}
+
+        mountain_of = {}
+        for i, store in enumerate(order):
+            if isinstance(store, TrailSeries):
+                self.kind[i] = SERIES
+                m = mountain_of.get(id(store.mountain))
+                if m is None:
+                    m = mountain_of[id(store.mountain)] = len(self.mountains)
+                    self.mountains.append(store.mountain)
+                self.mountain[i] = m
+                self.following[i] = offset(store.following)
+            else:
+                self.kind[i] = SPLIT
+                self.path_top[i] = offset(store.path_top)
+                self.path_bottom[i] = offset(store.path_bottom)
+                self.path_follow[i] = offset(store.path_follow)
+                self.branch_trails[i] = (store.path_top, store.path_bottom)
+
+        self.root = EMPTY if n == 0 else 0
+
+    def __len__(self) -> int:
+        """Number of compiled nodes."""
+        return len(self.kind)
+
+    def follow_path(self, personality: WalkerPersonality) -> None:
+        """
+        Follow a path and add mountains according to a personality, as Trail.follow_path does.
+
+        :complexity: O(n), where n is the number of nodes on the path
+        """
+        kind, mountain, following = self.kind, self.mountain, self.following
+        path_top, path_bottom, path_follow = self.path_top, self.path_bottom, self.path_follow
+        mountains = self.mountains
+        pending = []
+
+        node = self.root
+        while True:
+            if node == EMPTY:
+                if not pending:
+                    break
+                node = pending.pop()
+            elif kind[node] == SERIES:
+                personality.add_mountain(mountains[mountain[node]])
+                node = following[node]
+            else:
+                pending.append(path_follow[node])
+                if personality.select_branch(*self.branch_trails[node]) is True:
+                    node = path_top[node]
+                else:
+                    node = path_bottom[node]
+
+    def collect_all_mountains(self) -> list[Mountain]:
+        """
+        Returns a list of all mountains on the trail, in the same order as Trail.collect_all_mountains.
+
+        :complexity: O(n), where n is the number of mountains in the trail
+        """
+        kind, mountain, following = self.kind, self.mountain, self.following
+        path_top, path_bottom, path_follow = self.path_top, self.path_bottom, self.path_follow
+        mountains = self.mountains
+        res = []
+        pending = []
+
+        node = self.root
+        while True:
+            if node == EMPTY:
+                if not pending:
+                    return res
+                node = pending.pop()
+            elif kind[node] == SERIES:
+                res.append(mountains[mountain[node]])
+                node = following[node]
+            else:
+                pending.append(path_follow[node])
+                pending.append(path_bottom[node])
+                node = path_top[node]
+
+    def length_k_paths(self, k: int) -> list[list[Mountain]]:
+        """
+        Returns a list of all paths containing exactly k mountains, as Trail.length_k_paths does.
+
+        :complexity: O(n*k), where n is the number of paths explored
+        """
+        kind, mountain, following = self.kind, self.mountain, self.following
+        path_top, path_bottom, path_follow = self.path_top, self.path_bottom, self.path_follow
+        mountains = self.mountains
+        paths = []
+        path = []
+        # Frames are (node, depth, pending follow nodes as a linked list of tuples).
+        frames = [(self.root, 0, None)]
+        while frames:
+            node, depth, pending = frames.pop()
+            del path[depth:]
+            while True:
+                if node == EMPTY:
+                    if pending is None:
+                        if depth == k:
+                            paths.append([mountains[m] for m in path])
+                        break
+                    node, pending = pending
+                elif kind[node] == SERIES:
+                    if depth == k:
+                        break
+                    path.append(mountain[node])
+                    depth += 1
+                    node = following[node]
+                else:
+                    pending = (path_follow[node], pending)
+                    frames.append((path_bottom[node], depth, pending))
+                    node = path_top[node]
+        return paths
+
+def compile_trail(trail: Trail) -> CompiledTrail:
+    """
+    Returns the compiled form of the trail, reusing the last one built until the trail is edited.
+
+    The compiled trail is cached on the root, which registers as a dependent of every node
+    and mountain it was built from, so any edit below the root drops it.
+
+    :complexity: O(1) if cached, otherwise O(n), where n is the number of nodes in the trail
+    """
+    compiled = trail.get_cached("compiled")
+    if compiled is None:
+        compiled = CompiledTrail(trail)
+        sources = [trail, *compiled.mountains]
+        for store in compiled.stores:
+            sources.append(store)
+            if isinstance(store, TrailSeries):
+                sources.append(store.following)
+            else:
+                sources += (store.path_top, store.path_bottom, store.path_follow)
+        trail.set_cached("compiled", compiled, sources)
+    return compiled
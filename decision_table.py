@@ -0,0 +1,133 @@
+"""
+Compiled branch decisions for deterministic walker personalities.
+
+A deterministic personality (see WalkerPersonality.DETERMINISTIC) makes the same choice at a
+given split every time it is asked, so there is no need to ask again on every walk. A DecisionTable
+asks once per split on the personality's route, stores the answers as a bit-vector over the trail's
+splits and replays them over the compiled trail without calling into the personality.
+"""
+from __future__ import annotations
+
+from array import array
+
+from compiled_trail import CompiledTrail, compile_trail, EMPTY, SERIES
+from mountain import Mountain
+from personality import WalkerPersonality
+from trail import Trail
+
+class DecisionTable:
+    """
+    The branches a personality takes at each split it reaches, one bit per split
+    (1 for top), numbered in the compiled trail's node order.
+    """
+
+    def __init__(self, compiled: CompiledTrail, personality: WalkerPersonality) -> None:
+        """
+        Walks the route once, asking the personality about every split on it.
+
+        :complexity: O(n), where n is the number of nodes on the route
+        """
+        self.compiled = compiled
+        kind = compiled.kind
+        self.split_number = array("i", [EMPTY]) * len(kind)
+        splits = 0
+        for node in range(len(kind)):
+            if kind[node] != SERIES:
+                self.split_number[node] = splits
+                splits += 1
+        self.choices = bytearray((splits + 7) // 8)
+        probed = bytearray((splits + 7) // 8)
+
+        pending = []
+        node = compiled.root
+        while True:
+            if node == EMPTY:
+                if not pending:
+                    break
+                node = pending.pop()
+            elif kind[node] == SERIES:
+                node = compiled.following[node]
+            else:
+                pending.append(compiled.path_follow[node])
+                split = self.split_number[node]
+                byte, bit = split >> 3, 1 << (split & 7)
+                if not probed[byte] & bit:
+                    probed[byte] |= bit
+                    if personality.select_branch(*compiled.branch_trails[node]) is True:
+                        self.choices[byte] |= bit
+                node = compiled.path_top[node] if self.choices[byte] & bit else compiled.path_bottom[node]
+
+    def route(self) -> list[Mountain]:
+        """
+        Returns the mountains on the recorded route.
+
+        :complexity: O(n), where n is the number of nodes on the route
+        """
+        compiled = self.compiled
+        kind, mountain, following = compiled.kind, compiled.mountain, compiled.following
+        path_top, path_bottom, path_follow = compiled.path_top, compiled.path_bottom, compiled.path_follow
+        mountains, split_number, choices = compiled.mountains, self.split_number, self.choices
+        res = []
+        pending = []
+
+        node = compiled.root
+        while True:
+            if node == EMPTY:
+                if not pending:
+                    return res
+                node = pending.pop()
+            elif kind[node] == SERIES:
+                res.append(mountains[mountain[node]])
+                node = following[node]
+            else:
+                pending.append(path_follow[node])
+                split = split_number[node]
+                if choices[split >> 3] >> (split & 7) & 1:
+                    node = path_top[node]
+                else:
+                    node = path_bottom[node]
+
+def decision_table(trail: Trail, personality: WalkerPersonality) -> DecisionTable:
+    """
+    Returns the decision table for the personality on this trail.
+
+    If the personality's class sets DETERMINISTIC itself, the table is shared by every instance of it and
+    cached on the trail along with its compiled form, so the personality is only probed if there
+    is no table yet, and editing the trail drops it. Any other personality is probed for a new
+    table every time, as it may choose differently from another instance or from one walk to the next.
+    Probing adds no mountains to the personality, so a personality whose choices depend on the
+    mountains it has walked may choose differently from Trail.follow_path.
+
+    :complexity: O(1) if cached, otherwise O(n), where n is the number of nodes in the trail
+    """
+    compiled = compile_trail(trail)
+    if not type(personality).__dict__.get("DETERMINISTIC", False):
+        return DecisionTable(compiled, personality)
+    tables = trail.get_cached("decisions")
+    if tables is None or tables[0] is not compiled:
+        tables = (compiled, {})
+        trail.set_cached("decisions", tables)
+    table = tables[1].get(type(personality))
+    if table is None:
+        table = tables[1][type(personality)] = DecisionTable(compiled, personality)
+    return table
+
+def follow_compiled_path(trail: Trail, personality: WalkerPersonality) -> None:
+    """
+    Follow a path as Trail.follow_path does, replaying the personality's compiled decisions
+    instead of asking it at every split. The mountains are added to the personality.
+
+    A personality whose class does not set DETERMINISTIC may depend on what it has walked,
+    so it walks the trail with Trail.follow_path instead, choosing after each mountain is added.
+
+    :complexity: O(n), where n is the number of nodes on the route, once the table is built
+    """
+    if not type(personality).__dict__.get("DETERMINISTIC", False):
+        trail.follow_path(personality)
+        return
+    route = decision_table(trail, personality).route()
+    if type(personality).add_mountain is WalkerPersonality.add_mountain:
+        personality.mountains.extend(route)
+    else:
+        for mountain in route:
+            personality.add_mountain(mountain)
@@ -5,7 +5,6 @@ Requires no student import, but will use your implemented classes as part of it'
 
 import arcade
 import arcade.gui as gui
-import json
 import sys
 import secrets
 from copy import copy
@@ -17,7 +16,8 @@ from trail import Trail, TrailSeries, TrailSplit
 from draw_trails import TrailDraw
 from mountain_organiser import MountainOrganiser
 from double_key_table import DoubleKeyTable
-from serialize import serialize, deserialize
+from serialize import load_store
+from trail_journal import TrailJournal, load_journaled, save_journaled
 
 class MyWindow(arcade.Window):
     """ Painter Window """
@@ -278,15 +278,21 @@ class MyWindow(arcade.Window):
         self.reset()
         self.mountain_manager = MountainManager()
         self.cur_filename = sys.argv[1] if len(sys.argv) > 1 else "basic.json"
-        with open(f"stores/{self.cur_filename}", "r") as f:
-            t = deserialize(json.loads(f.read()))
+        # Loaded whole: the first frame draws every branch, and the manager and journal index every mountain.
+        try:
+            t = load_journaled(f"stores/{self.cur_filename}")
+        except ValueError:
+            # The store was replaced outside the GUI, so its journal no longer applies;
+            # TrailJournal below starts it afresh.
+            t = load_store(f"stores/{self.cur_filename}")
         try:
             # Try to add all existing mountains
-            for mountain in t.collect_all_mountains():
+            for mountain in t.iter_mountains():
                 self.mountain_manager.add_mountain(mountain)
         except NotImplementedError:
             pass
         self.mountain = TrailDraw(t)
+        self.journal = TrailJournal(t, f"stores/{self.cur_filename}")
         self.draw_box = None
 
     def on_draw(self) -> None:
@@ -462,9 +468,14 @@ class MyWindow(arcade.Window):
         self.cur_editing_mountain = None
 
     def on_file_save_clicked(self, event):
-        new_path = str(self.input_file_name.text)
-        with open(f"stores/{new_path}", "w") as f:
-            f.write(serialize(self.mountain.trail))
+        new_path = f"stores/{self.input_file_name.text}"
+        if new_path == self.journal.path:
+            # Only the edits since the last save need writing.
+            self.journal.save()
+        else:
+            self.journal.close()
+            save_journaled(self.mountain.trail, new_path)
+            self.journal = TrailJournal(self.mountain.trail, new_path)
         # Close the window.
         self.on_file_close_clicked(event)
 
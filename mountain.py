@@ -1,9 +1,18 @@
 from __future__ import annotations
 from dataclasses import dataclass
 
-@dataclass
-class Mountain:
+from tracked import TrackedNode, init_field
+
+@dataclass(init=False)
+class Mountain(TrackedNode):
+
+    TRACKED_FIELDS = ("name", "difficulty_level", "length")
 
     name: str
     difficulty_level: int
     length: int
+
+    def __init__(self, name: str, difficulty_level: int, length: int) -> None:
+        init_field(self, "name", name)
+        init_field(self, "difficulty_level", difficulty_level)
+        init_field(self, "length", length)
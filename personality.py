@@ -1,9 +1,16 @@
 from abc import ABC, abstractmethod
+import random
 from mountain import Mountain
-from trail import Trail
+from trail import Trail, TrailSeries
+from route_planner import route_value
 
 class WalkerPersonality(ABC):
 
+    # True if every instance makes the same choice at a given split, every time it is asked,
+    # so decision_table can share one table between them. It is not inherited: decision_table
+    # only reads it from the personality's own class, so a subclass has to set it again to opt in.
+    DETERMINISTIC = False
+
     def __init__(self) -> None:
         self.mountains = []
 
@@ -19,28 +26,93 @@ class WalkerPersonality(ABC):
             return True
 
 class TopWalker(WalkerPersonality):
+    DETERMINISTIC = True
+
     def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
         # Always select the top branch
         return True                                                                     #true means select top branch and false means select bottom branch
 
 class BottomWalker(WalkerPersonality):
+    DETERMINISTIC = True
+
     def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
         # Always select the bottom branch
         return False
 
 class LazyWalker(WalkerPersonality):
+    DETERMINISTIC = True
+
     def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
         """
         Try looking into the first mountain on each branch,
         take the path of least difficulty.
         """
 
-        # isinstance breaks across imports if running the original file as main
-        # So just check __class__.__name__ :(
-        top_m = top_branch.store.__class__.__name__ == "TrailSeries"
-        bot_m = bottom_branch.store.__class__.__name__ == "TrailSeries"
+        top_m = isinstance(top_branch.store, TrailSeries)
+        bot_m = isinstance(bottom_branch.store, TrailSeries)
         if top_m and bot_m:
             return top_branch.store.mountain.difficulty_level < bottom_branch.store.mountain.difficulty_level
         # If one of them has a mountain, don't take it.
         # If neither do, then take the top branch.
         return not top_m
+
+class LookaheadWalker(WalkerPersonality):
+    """
+    Takes the branch whose best route has the lowest total of a Mountain attribute
+    (highest, if MAXIMISE), preferring the top branch on ties.
+
+    Branch scores come from route_planner.route_value, which is cached on the trail,
+    so each decision is O(1) once the branch has been scored.
+    """
+
+    OBJECTIVE = "difficulty_level"
+    MAXIMISE = False
+    DETERMINISTIC = True
+
+    def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+        top = route_value(top_branch, self.OBJECTIVE, self.MAXIMISE)
+        bottom = route_value(bottom_branch, self.OBJECTIVE, self.MAXIMISE)
+        return top >= bottom if self.MAXIMISE else top <= bottom
+
+class EasiestWalker(LookaheadWalker):
+    """Takes the branch with the lowest total difficulty."""
+    OBJECTIVE = "difficulty_level"
+    DETERMINISTIC = True
+
+class ShortestWalker(LookaheadWalker):
+    """Takes the branch with the shortest total length."""
+    OBJECTIVE = "length"
+    DETERMINISTIC = True
+
+class ReplayWalker(WalkerPersonality):
+    """
+    Takes the branches it is given, in order: True for top, False for bottom.
+    Used to walk routes found by route_planner.
+    """
+
+    def __init__(self, choices) -> None:
+        super().__init__()
+        self.choices = iter(choices)
+
+    def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+        return next(self.choices)
+
+class RandomWalker(WalkerPersonality):
+    """
+    Takes the top branch with probability top_probability(top_branch, bottom_branch),
+    drawing from its own random.Random(seed), so a seeded walker is reproducible.
+
+    Every split uses p_top by default. Override top_probability to weight splits differently;
+    walk_simulation.simulate_walks uses it too.
+    """
+
+    def __init__(self, p_top: float = 0.5, seed=None) -> None:
+        super().__init__()
+        self.p_top = p_top
+        self.rng = random.Random(seed)
+
+    def top_probability(self, top_branch: Trail, bottom_branch: Trail) -> float:
+        return self.p_top
+
+    def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+        return self.rng.random() < self.top_probability(top_branch, bottom_branch)
@@ -0,0 +1,124 @@
+"""
+Optimal-route queries over trails.
+
+A route is one way through a trail, taking the top or bottom branch at every split.
+Routes are scored by summing a Mountain attribute (difficulty_level or length) over the
+mountains on them. The best score of every subtree comes from one dynamic programming pass,
+cached on the trail (see trail_aggregates.cached_fold), and the k best routes are then found
+lazily with a heap, without enumerating the rest.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from heapq import heappop, heappush
+from itertools import count, islice
+from typing import Iterator
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+from trail_aggregates import cached_fold
+
+OBJECTIVES = ("difficulty_level", "length")
+
+@dataclass
+class Route:
+    """
+    A route through a trail.
+
+    choices are the branches taken at each split in the order follow_path meets them,
+    True for top and False for bottom, so personality.ReplayWalker(choices) walks this route.
+    """
+
+    score: int
+    choices: list[bool]
+    mountains: list[Mountain]
+
+def route_value(node: Trail|TrailStore, objective: str = "difficulty_level", maximise: bool = False) -> int:
+    """
+    Returns the best score of any route through a trail or subtree.
+
+    :raises ValueError: if objective is not one of OBJECTIVES
+
+    :complexity: O(1) if cached, otherwise O(n) for the n uncached nodes below node
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective}")
+    pick = max if maximise else min
+    return cached_fold(
+        node,
+        f"route_{objective}_{'max' if maximise else 'min'}",
+        0,
+        lambda mountain, following: getattr(mountain, objective) + following,
+        lambda top, bottom, follow: pick(top, bottom) + follow,
+    )
+
+def best_routes(trail: Trail, objective: str = "difficulty_level", maximise: bool = False) -> Iterator[Route]:
+    """
+    Lazily yields every route through the trail, best first.
+
+    Partial routes are kept in a heap ordered by their score so far plus the best score
+    that can still be added, which is exact, so routes come out in order and only
+    partial routes that could lead to the next result are expanded.
+
+    :raises ValueError: if objective is not one of OBJECTIVES
+
+    :complexity: O(p*log(h)) per route, where p is the number of nodes on the route and h the heap size,
+                 after O(n) to score the trail
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective {objective}")
+    sign = -1 if maximise else 1
+    value = lambda store: 0 if store is None else route_value(store, objective, maximise)
+    # Among equal priorities, expand the newest entry first, so ties are explored depth first
+    # rather than breadth first across every equally good partial route.
+    tie = count(0, -1)
+
+    # Entries are (priority, tie breaker, store, pending follow stores, best score of the pending stores,
+    # score so far, choices so far, mountains so far). Pending stores, choices and mountains are
+    # linked lists of (item, rest) tuples, shared between entries.
+    heap = [(sign * value(trail.store), next(tie), trail.store, None, 0, 0, None, None)]
+    while heap:
+        _, _, store, pending, rest, score, choices, mountains = heappop(heap)
+        while True:
+            if store is None:
+                if pending is None:
+                    yield Route(score, _unlink(choices), _unlink(mountains))
+                    break
+                (store, pending), rest = pending, rest - value(pending[0])
+            elif isinstance(store, TrailSeries):
+                score += getattr(store.mountain, objective)
+                mountains = (store.mountain, mountains)
+                store = store.following.store
+            elif isinstance(store, TrailSplit):
+                pending = (store.path_follow.store, pending)
+                rest += value(store.path_follow.store)
+                for branch, choice in ((store.path_top, True), (store.path_bottom, False)):
+                    priority = sign * (score + value(branch.store) + rest)
+                    heappush(heap, (priority, next(tie), branch.store, pending, rest, score, (choice, choices), mountains))
+                break
+            else:
+                raise ValueError("Invalid TrailStore")
+
+def _unlink(items: tuple|None) -> list:
+    res = []
+    while items is not None:
+        item, items = items
+        res.append(item)
+    res.reverse()
+    return res
+
+def best_route(trail: Trail, objective: str = "difficulty_level", maximise: bool = False) -> Route:
+    """
+    Returns the route with the lowest (or highest, if maximise) total objective.
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    return next(best_routes(trail, objective, maximise))
+
+def k_best_routes(trail: Trail, k: int, objective: str = "difficulty_level", maximise: bool = False) -> list[Route]:
+    """
+    Returns the k best routes, best first (fewer if the trail has fewer routes).
+
+    :complexity: O(n + k*p*log(h)), see best_routes
+    """
+    return list(islice(best_routes(trail, objective, maximise), k))
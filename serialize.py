@@ -1,43 +1,343 @@
-import dataclasses, json
+from __future__ import annotations
+import bz2, dataclasses, gzip, io, json, lzma, os, re
+from typing import TextIO
 
 from trail import Trail, TrailSplit, TrailSeries
 from mountain import Mountain
-
-# https://stackoverflow.com/questions/51286748/make-the-python-json-encoder-support-pythons-new-dataclasses
-class EnhancedJSONEncoder(json.JSONEncoder):
-    def default(self, o):
-        if dataclasses.is_dataclass(o):
-            res = dataclasses.asdict(o)
-            self.remove_box(res)
-            return res
-        return super().default(o)
-
-    def remove_box(self, obj):
-        if isinstance(obj, dict):
-            rm_keys = list(filter(lambda x: x.endswith("_box"), obj.keys()))
-            for key in rm_keys:
-                del obj[key]
-            for key in obj.keys():
-                self.remove_box(obj[key])
-        if isinstance(obj, list):
-            for o in obj:
-                self.remove_box(o)
+from trail_factory import TrailFactory
+import binary_store
 
 def serialize(trail):
-    return json.dumps(trail, cls=EnhancedJSONEncoder)
-
-def deserialize(obj):
-    if obj["store"] is None:
-        return Trail(None)
-    if "mountain" in obj["store"]:
-        inside = TrailSeries(
-            Mountain(**obj["store"]["mountain"]),
-            deserialize(obj["store"]["following"])
-        )
+    out = io.StringIO()
+    write_trail(trail, out)
+    return out.getvalue()
+
+_MOUNTAIN_FIELDS = [field.name for field in dataclasses.fields(Mountain) if not field.name.endswith("_box")]
+
+def _mountain_json(mountain: Mountain) -> str:
+    return "{" + ", ".join(f"{json.dumps(name)}: {json.dumps(getattr(mountain, name))}" for name in _MOUNTAIN_FIELDS) + "}"
+
+def write_trail(trail: Trail, f: TextIO, mountain_table: bool = False) -> None:
+    """
+    Writes the trail to a text file as JSON, with each node an object of its dataclass fields
+    (leaving out the _box fields), the way json.dumps would write dataclasses.asdict of it:
+
+        {"store": {"mountain": {"name": ..., "difficulty_level": ..., "length": ...}, "following": ...}}
+
+    If mountain_table, each distinct mountain is written once instead, in a table ahead of the trail,
+    and series refer to it by index:
+
+        {"mountains": [{"name": ..., "difficulty_level": ..., "length": ...}, ...],
+         "trail": {"store": {"mountain": 0, "following": ...}}}
+
+    The trail is walked once with an explicit stack and written as it goes, so no copy of it
+    is built and draw boxes are never visited. Runs of closing braces are kept as one count,
+    so a long chain of series does not grow the stack.
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    chunks = []
+    # (name, difficulty_level, length) -> index in the mountain table
+    mountains = None
+    if mountain_table:
+        mountains = {}
+        rows = []
+        for mountain in trail.iter_mountains():
+            key = (mountain.name, mountain.difficulty_level, mountain.length)
+            if key not in mountains:
+                mountains[key] = len(mountains)
+                rows.append(_mountain_json(mountain))
+        chunks.append('{"mountains": [' + ", ".join(rows) + '], "trail": ')
+    # Stack entries are a Trail still to write, a str to write, or an int number of "}}" to write.
+    stack = [trail]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, str):
+            chunks.append(item)
+        elif isinstance(item, int):
+            chunks.append("}}" * item)
+        elif item.store is None:
+            chunks.append('{"store": null}')
+        elif isinstance(item.store, TrailSeries):
+            mountain = item.store.mountain
+            chunks.append('{"store": {"mountain": ')
+            if mountains is None:
+                chunks.append(_mountain_json(mountain))
+            else:
+                chunks.append(str(mountains[mountain.name, mountain.difficulty_level, mountain.length]))
+            chunks.append(', "following": ')
+            if stack and isinstance(stack[-1], int):
+                stack[-1] += 1
+            else:
+                stack.append(1)
+            stack.append(item.store.following)
+        elif isinstance(item.store, TrailSplit):
+            chunks.append('{"store": {"path_top": ')
+            stack.extend((1, item.store.path_follow, ', "path_follow": ', item.store.path_bottom, ', "path_bottom": ', item.store.path_top))
+        else:
+            raise ValueError("Invalid TrailStore")
+        if len(chunks) >= 1024:
+            f.write("".join(chunks))
+            chunks.clear()
+    if mountains is not None:
+        chunks.append("}")
+    f.write("".join(chunks))
+
+def _build(obj: dict, factory: TrailFactory|None, table: list[Mountain]|None = None):
+    """
+    Turns a JSON object whose values have already been built into the node it describes.
+    Mountains come from factory.mountain if given, so equal mountains become one object.
+    A series whose mountain is an index takes it from the mountain table (see write_trail).
+
+    :raises ValueError: if a value is not the kind of node its key needs
+    :raises KeyError, TypeError: if the object is missing keys, or has keys no node has
+    """
+    if "store" in obj:
+        if not isinstance(obj["store"], (TrailSeries, TrailSplit, type(None))):
+            raise ValueError("Invalid trail file")
+        return Trail(obj["store"])
+    if "following" in obj:
+        mountain = obj["mountain"]
+        if isinstance(mountain, int):
+            if table is None or not 0 <= mountain < len(table):
+                raise KeyError(mountain)
+            mountain = table[mountain]
+            if factory is None:
+                # Each series gets its own Mountain unless they are being interned.
+                mountain = Mountain(mountain.name, mountain.difficulty_level, mountain.length)
+        if not isinstance(mountain, Mountain) or not isinstance(obj["following"], Trail):
+            raise ValueError("Invalid trail file")
+        return TrailSeries(mountain, obj["following"])
+    if "path_follow" in obj:
+        if not all(isinstance(obj[key], Trail) for key in ("path_top", "path_bottom", "path_follow")):
+            raise ValueError("Invalid trail file")
+        return TrailSplit(path_top=obj["path_top"], path_bottom=obj["path_bottom"], path_follow=obj["path_follow"])
+    return Mountain(**obj) if factory is None else factory.mountain(**obj)
+
+def deserialize(obj, factory: TrailFactory|None = None):
+    """
+    Builds a Trail from the JSON objects read from a store file, with or without a mountain table
+    (see write_trail), bottom up with an explicit stack, so trails of any depth load. If a factory is given, the trail is interned in it, so equal
+    mountains and identical sub-trails become one object, shared with other trails loaded with it.
+
+    :raises ValueError: if the objects are not a trail
+
+    :complexity: O(n), where n is the number of objects
+    """
+    try:
+        table = None
+        if "mountains" in obj:
+            table = [_build(row, factory) for row in obj["mountains"]]
+            obj = obj["trail"]
+        built = {}
+        stack = [obj]
+        while stack:
+            cur = stack[-1]
+            pending = [value for value in cur.values() if isinstance(value, dict) and id(value) not in built]
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            built[id(cur)] = _build({key: built[id(value)] if isinstance(value, dict) else value for key, value in cur.items()}, factory, table)
+    except (AttributeError, KeyError, TypeError):
+        raise ValueError("Invalid trail file")
+    trail = built[id(obj)]
+    if not isinstance(trail, Trail) or not all(isinstance(mountain, Mountain) for mountain in table or ()):
+        raise ValueError("Invalid trail file")
+    if factory is not None:
+        # Identical sub-trails in the file become one shared object.
+        return factory.intern(trail)
+    return trail
+
+_TOKEN = re.compile(r'\s*(?:([{}\[\]:,])|(")|(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)|(null|true|false)|(\S))')
+_LITERALS = {"null": None, "true": True, "false": False}
+
+def load_trail(f: TextIO, factory: TrailFactory|None = None, chunk_size: int = 1 << 16) -> Trail:
+    """
+    Reads a trail written by write_trail (or serialize) from a text file,
+    with or without a mountain table. The table must come before the trail, as write_trail puts it.
+
+    The file is read in chunks and parsed as it goes. Each JSON object becomes its Trail,
+    TrailSeries, TrailSplit or Mountain as soon as it closes, so only the objects still open
+    are held besides the trail itself, and trails of any depth load. If a factory is given,
+    the trail is interned in it (see deserialize).
+
+    :raises ValueError: if the file is not a trail
+
+    :complexity: O(n), where n is the size of the file
+    """
+    buf, pos, eof = "", 0, False
+    # Open objects, each with the key whose value is being read,
+    # and the mountain table, the only list allowed.
+    stack = []
+    # What the next token must be: "value", "key" or "colon"; "first value" and "first key" also allow
+    # closing the list or object just opened, "next" is a comma or a close, and "end" allows nothing.
+    expect = "value"
+    result = None
+    table = None
+    while True:
+        match = _TOKEN.match(buf, pos)
+        # Read more if the token might continue past the end of what has been read.
+        if not eof and (match is None or match.end() == len(buf) or len(buf) - pos < 32):
+            chunk = f.read(chunk_size)
+            buf, pos, eof = buf[pos:] + chunk, 0, not chunk
+            continue
+        if match is None:
+            break
+        punctuation, quote, number, literal, other = match.groups()
+        wants_value = expect in ("value", "first value")
+        pos = match.end()
+        if quote:
+            if not wants_value and expect not in ("key", "first key"):
+                raise ValueError("Invalid trail file")
+            try:
+                value, end = json.decoder.scanstring(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise ValueError("Invalid trail file")
+                buf, pos, eof = buf[match.start():] + f.read(chunk_size), 0, False
+                continue
+            pos = end
+            if not wants_value:
+                stack[-1][1] = value
+                expect = "colon"
+                continue
+        elif punctuation == "{" and wants_value:
+            stack.append([{}, None])
+            expect = "first key"
+            continue
+        elif punctuation == "[" and wants_value:
+            if len(stack) != 1 or stack[0][1] != "mountains":
+                raise ValueError("Invalid trail file")
+            stack.append([[], None])
+            expect = "first value"
+            continue
+        elif punctuation == "," and expect == "next":
+            expect = "key" if isinstance(stack[-1][0], dict) else "value"
+            continue
+        elif punctuation == ":" and expect == "colon":
+            expect = "value"
+            continue
+        elif punctuation == "]" and expect in ("next", "first value") and isinstance(stack[-1][0], list):
+            value = table = stack.pop()[0]
+            if not all(isinstance(mountain, Mountain) for mountain in table):
+                raise ValueError("Invalid trail file")
+        elif punctuation == "}" and expect in ("next", "first key") and isinstance(stack[-1][0], dict):
+            obj = stack.pop()[0]
+            if not stack and "mountains" in obj:
+                value = obj.get("trail")
+            else:
+                try:
+                    value = _build(obj, factory, table)
+                except (KeyError, TypeError):
+                    raise ValueError("Invalid trail file")
+        elif number and wants_value:
+            value = int(number) if number.lstrip("-").isdigit() else float(number)
+        elif literal and wants_value:
+            value = _LITERALS[literal]
+        else:
+            raise ValueError("Invalid trail file")
+        if not stack:
+            result = value
+            expect = "end"
+        elif isinstance(stack[-1][0], list):
+            stack[-1][0].append(value)
+            expect = "next"
+        else:
+            obj, key = stack[-1]
+            obj[key] = value
+            expect = "next"
+    if expect != "end" or not isinstance(result, Trail):
+        raise ValueError("Invalid trail file")
+    if factory is not None:
+        return factory.intern(result)
+    return result
+
+# Codec name -> (open function, magic bytes, extensions)
+CODECS = {
+    "gzip": (gzip.open, b"\x1f\x8b", (".gz",)),
+    "bz2": (bz2.open, b"BZh", (".bz2",)),
+    "lzma": (lzma.open, b"\xfd7zXZ\x00", (".xz", ".lzma")),
+}
+
+def codec_for_path(path: str) -> str|None:
+    """Returns the codec whose extension ends the path, or None."""
+    for codec, (_, _, extensions) in CODECS.items():
+        if path.endswith(extensions):
+            return codec
+    return None
+
+def detect_codec(path: str) -> str|None:
+    """
+    Returns the codec a file was compressed with, from its first bytes, or None if it is not compressed.
+
+    :complexity: O(1)
+    """
+    with open(path, "rb") as f:
+        head = f.read(8)
+    for codec, (_, magic, _) in CODECS.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+def save_store(trail: Trail, path: str, codec: str|None = None) -> None:
+    """
+    Saves the trail to a store file, in the binary .trail format if the path (less any codec extension)
+    ends in .trail, otherwise as JSON with a mountain table (see write_trail).
+
+    The file is compressed as it is written with codec, one of CODECS, or by default the codec
+    whose extension ends the path (as in basic.json.gz or big.trail.xz), if any.
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    if codec is None:
+        codec = codec_for_path(path)
+    opener = open if codec is None else CODECS[codec][0]
+    if codec_for_path(path) is not None:
+        binary = os.path.splitext(path)[0].endswith(".trail")
     else:
-        inside = TrailSplit(
-            deserialize(obj["store"]["path_bottom"]),
-            deserialize(obj["store"]["path_top"]),
-            deserialize(obj["store"]["path_follow"])
-        )
-    return Trail(inside)
+        binary = path.endswith(".trail")
+    if binary:
+        with opener(path, "wb") as f:
+            binary_store.write_binary(trail, f)
+    else:
+        with opener(path, "wt") as f:
+            write_trail(trail, f, mountain_table=True)
+
+def load_store(path: str, factory: TrailFactory|None = None, lazy: bool = False) -> Trail:
+    """
+    Loads a store file saved by save_store. The codec and format are detected from the first bytes
+    of the file (and of its decompressed stream), whatever its extension.
+    If a factory is given, the trail is interned in it, so equal mountains become one object,
+    shared with other trails loaded with the same factory. Otherwise every series gets its own Mountain.
+
+    If lazy, a .trail file is opened with binary_store.load_lazy, so branches are only decoded
+    once they are visited (and sub-trails are not interned); a compressed one is decompressed
+    into memory first. JSON files are always loaded whole, decompressing as they are read.
+
+    :raises ValueError: if the file is not a trail
+
+    :complexity: O(n), where n is the size of the file
+    """
+    codec = detect_codec(path)
+    if codec is None:
+        with open(path, "rb") as f:
+            binary = f.read(len(binary_store.MAGIC)) == binary_store.MAGIC
+        if binary:
+            if lazy:
+                return binary_store.load_lazy(path, factory)
+            return binary_store.load_binary(path, factory)
+        with open(path, "r") as f:
+            return load_trail(f, factory)
+
+    with CODECS[codec][0](path, "rb") as f:
+        try:
+            binary = f.peek(len(binary_store.MAGIC))[:len(binary_store.MAGIC)] == binary_store.MAGIC
+            if binary:
+                data = f.read()
+                if lazy:
+                    return binary_store.decode_lazy(data, factory)
+                return binary_store.decode(data, factory)
+            return load_trail(io.TextIOWrapper(f), factory)
+        except (EOFError, OSError, lzma.LZMAError) as e:
+            raise ValueError("Invalid trail file") from e
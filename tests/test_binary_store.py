@@ -0,0 +1,162 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from binary_store import TrailReader, LazyTrail, encode, decode, EMPTY_TAG, SERIES_TAG, SPLIT_TAG
+from personality import BottomWalker
+from tracked import add_edit_listener, remove_edit_listener
+from serialize import save_store, load_store, serialize, deserialize
+from trail_factory import TrailFactory
+
+class TestBinaryStore(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    @number("17.1")
+    def test_round_trip(self):
+        self.load_example()
+        self.assertEqual(decode(encode(self.trail)), self.trail)
+        self.assertEqual(decode(encode(Trail(None))), Trail(None))
+        odd = Trail(TrailSeries(Mountain("ñ-" * 100, -3, 1 << 40), Trail(None)))
+        self.assertEqual(decode(encode(odd)), odd)
+
+        # The reader can jump to a branch without decoding the ones before it.
+        reader = TrailReader(encode(self.trail))
+        tag, top, bottom, follow = reader.record(reader.root)
+        self.assertEqual(tag, SPLIT_TAG)
+        tag, mountain, following = reader.record(follow)
+        self.assertEqual((tag, mountain), (SERIES_TAG, self.final))
+        self.assertEqual(reader.record(following), (EMPTY_TAG,))
+        self.assertEqual(reader.trail(bottom), self.trail.store.path_bottom)
+
+        for bad in (b"", b"TRAIL", b"NOPE\x01\x00\x00", b"TRAIL\x09\x00\x00", encode(self.trail)[:-1]):
+            with self.assertRaises(ValueError):
+                decode(bad)
+
+    @number("17.2")
+    def test_save_and_load_store(self):
+        self.load_example()
+        with open("stores/basic.json") as f:
+            basic = deserialize(json.load(f))
+        with tempfile.TemporaryDirectory() as directory:
+            for trail in (self.trail, basic):
+                for name in ("t.trail", "t.json"):
+                    path = os.path.join(directory, name)
+                    save_store(trail, path)
+                    self.assertEqual(load_store(path), trail)
+
+            # Names are stored once, and there are no keys.
+            big = Trail(None)
+            for i in range(2000):
+                big = Trail(TrailSplit(Trail(TrailSeries(Mountain(f"peak {i % 10}", i % 7, i % 13), Trail(None))), Trail(None), big))
+            save_store(big, os.path.join(directory, "big.trail"))
+            self.assertLess(os.path.getsize(os.path.join(directory, "big.trail")) * 10, len(serialize(big)))
+            self.assertEqual(load_store(os.path.join(directory, "big.trail")), big)
+
+            open(os.path.join(directory, "empty.trail"), "wb").close()
+            with self.assertRaises(ValueError):
+                load_store(os.path.join(directory, "empty.trail"))
+
+    @number("17.3")
+    def test_shared_mountains(self):
+        same = Mountain("same", 1, 2)
+        trail = Trail(TrailSplit(
+            Trail(TrailSeries(same, Trail(None))),
+            Trail(TrailSeries(Mountain("same", 1, 2), Trail(TrailSeries(Mountain("other", 1, 2), Trail(None))))),
+            Trail(TrailSeries(same, Trail(None))),
+        ))
+        data = encode(trail)
+        # Two table entries, each name written once.
+        self.assertEqual(data.count(b"same"), 1)
+        self.assertEqual(len(TrailReader(data).table), 2)
+
+        with tempfile.TemporaryDirectory() as directory:
+            for name in ("t.trail", "t.json"):
+                path = os.path.join(directory, name)
+                save_store(trail, path)
+                self.assertEqual(load_store(path), trail)
+                # Without a factory every series gets its own mountain, so editing one leaves the rest alone.
+                for lazy in (False, True):
+                    mountains = list(load_store(path, lazy=lazy).iter_mountains())
+                    self.assertEqual(mountains[0], mountains[1])
+                    self.assertIsNot(mountains[0], mountains[1])
+                    mountains[0].name = "renamed"
+                    self.assertEqual([m.name for m in mountains], ["renamed", "same", "other", "same"])
+
+                # A factory shares equal mountains, within a file and between files.
+                factory = TrailFactory()
+                mountains = list(load_store(path, factory).iter_mountains())
+                self.assertIs(mountains[0], mountains[1])
+                self.assertIs(mountains[0], mountains[3])
+                self.assertIsNot(mountains[0], mountains[2])
+                first, second = load_store(path, factory), load_store(path, factory)
+                self.assertIs(first.store.path_top.store.mountain, second.store.path_follow.store.mountain)
+                self.assertIs(first, second)
+
+        # Version 1 files are still read.
+        v1 = (b"TRAIL\x01\x02\x04same\x05other"
+              b"\x02\x05\x09"
+              b"\x01\x00\x02\x04\x00"
+              b"\x01\x00\x02\x04\x01\x01\x02\x04\x00"
+              b"\x01\x00\x02\x04\x00")
+        self.assertEqual(decode(v1), trail)
+        loaded = decode(v1, TrailFactory())
+        self.assertEqual(loaded, trail)
+        self.assertIs(loaded.store.path_top.store.mountain, loaded.store.path_follow.store.mountain)
+
+    @number("17.4")
+    def test_lazy_loading(self):
+        self.load_example()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "t.trail")
+            save_store(self.trail, path)
+            lazy = load_store(path, lazy=True)
+            self.assertIsInstance(lazy, LazyTrail)
+
+            # Walking the bottom route decodes nothing on the top branch.
+            walker = BottomWalker()
+            lazy.follow_path(walker)
+            self.assertListEqual(walker.mountains, [self.bot_one, self.final])
+            self.assertIsInstance(lazy.store.path_top, LazyTrail)
+            self.assertNotIsInstance(lazy.store.path_bottom, LazyTrail)
+            self.assertEqual(lazy, self.trail)
+            self.assertNotIsInstance(lazy.store.path_top, LazyTrail)
+
+            # Edits to branches that were never read are seen by edit listeners.
+            lazy = load_store(path, lazy=True)
+            edits = []
+            listener = lambda node, field, old, new: edits.append((node, field, old, new))
+            add_edit_listener(listener)
+            try:
+                top = lazy.store.path_top
+                top.store = top.store.remove_branch()
+            finally:
+                remove_edit_listener(listener)
+            self.assertEqual(len(edits), 1)
+            self.assertIs(edits[0][0], top)
+            self.assertEqual(edits[0][2], self.trail.store.path_top.store)
+            self.assertEqual(copy.deepcopy(load_store(path, lazy=True)), self.trail)
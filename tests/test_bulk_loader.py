@@ -0,0 +1,67 @@
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from serialize import save_store
+from trail_factory import TrailFactory
+from trail_journal import TrailJournal
+from bulk_loader import load_batch, load_directory
+
+class TestBulkLoader(unittest.TestCase):
+
+    def make_trail(self, i):
+        return Trail(TrailSplit(
+            Trail(TrailSeries(Mountain(f"top-{i}", i, 1), Trail(None))),
+            Trail(TrailSeries(Mountain("shared", 1, 2), Trail(None))),
+            Trail(TrailSeries(Mountain(f"final-{i}", -i, i * 10), Trail(None))),
+        ))
+
+    @number("19.1")
+    def test_load_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for i in range(12):
+                save_store(self.make_trail(i), os.path.join(directory, f"{i:02}" + (".trail" if i % 2 else ".json")))
+            # Journalled edits are included.
+            trail = self.make_trail(12)
+            path = os.path.join(directory, "12.json")
+            save_store(trail, path)
+            journal = TrailJournal(trail, path)
+            trail.store.path_top.store.mountain.name = "edited"
+            journal.save()
+            journal.close()
+            open(os.path.join(directory, "notes.txt"), "w").close()
+
+            batch = load_batch(path)
+            self.assertEqual(len(batch), 3)
+            self.assertListEqual(batch.names, ["edited", "shared", "final-12"])
+            self.assertListEqual(list(batch.lengths), [1, 2, 120])
+
+            serial = load_directory(directory, workers=1)
+            parallel = load_directory(directory, workers=3)
+            self.assertEqual(len(parallel.mountains), 39)
+            self.assertListEqual(parallel.mountains, serial.mountains)
+            self.assertEqual(parallel.mountains[-1], Mountain("final-12", -12, 120))
+            # Equal mountains are separate objects, so editing one leaves the others alone...
+            shared = [m for m in parallel.mountains if m.name == "shared"]
+            self.assertEqual(len({id(m) for m in shared}), len(shared))
+            shared[0].length = 99
+            self.assertTrue(all(m.length == 2 for m in shared[1:]))
+            # ...unless they are made by a factory.
+            factory = TrailFactory()
+            shared = [m for m in load_directory(directory, workers=3, factory=factory).mountains if m.name == "shared"]
+            self.assertTrue(all(m is shared[0] for m in shared))
+            self.assertIs(shared[0], factory.mountain("shared", 1, 2))
+
+            # A store being compacted by another process is read as it stands, and its files left alone.
+            lock = os.path.join(directory, ".compacting.12.json.lock")
+            with open(lock, "w") as f:
+                f.write(str(os.getppid()))
+            for leftover in (os.path.join(directory, ".compacting.12.json"), path + ".journal.next"):
+                with open(leftover, "w") as f:
+                    f.write("garbage")
+            before = {name: os.path.getmtime(os.path.join(directory, name)) for name in os.listdir(directory)}
+            self.assertListEqual(load_directory(directory, workers=3).mountains, serial.mountains)
+            self.assertEqual({name: os.path.getmtime(os.path.join(directory, name)) for name in os.listdir(directory)}, before)
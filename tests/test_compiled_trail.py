@@ -0,0 +1,58 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from compiled_trail import CompiledTrail, EMPTY, SERIES, SPLIT
+from personality import TopWalker, BottomWalker, LazyWalker
+
+class TestCompiledTrail(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    @number("8.1")
+    def test_layout(self):
+        self.load_example()
+        compiled = CompiledTrail(self.trail)
+
+        self.assertEqual(len(compiled), 9)
+        self.assertEqual(compiled.kind[0], SPLIT)
+        self.assertEqual(compiled.kind[compiled.path_follow[0]], SERIES)
+        self.assertIs(compiled.mountains[compiled.mountain[compiled.path_follow[0]]], self.final)
+        self.assertEqual(compiled.following[compiled.path_follow[0]], EMPTY)
+        self.assertEqual(CompiledTrail(Trail(None)).root, EMPTY)
+
+    @number("8.2")
+    def test_matches_trail(self):
+        self.load_example()
+        compiled = CompiledTrail(self.trail)
+
+        for walker in (TopWalker, BottomWalker, LazyWalker):
+            expected, actual = walker(), walker()
+            self.trail.follow_path(expected)
+            compiled.follow_path(actual)
+            self.assertListEqual(actual.mountains, expected.mountains)
+
+        self.assertListEqual(compiled.collect_all_mountains(), self.trail.collect_all_mountains())
+        for k in range(5):
+            self.assertListEqual(compiled.length_k_paths(k), self.trail.length_k_paths(k))
+        self.assertEqual(len(compiled.length_k_paths(3)), 3)
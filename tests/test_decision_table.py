@@ -0,0 +1,142 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from decision_table import decision_table, follow_compiled_path
+from personality import WalkerPersonality, TopWalker, BottomWalker, LazyWalker, EasiestWalker, ShortestWalker, ReplayWalker
+
+class CountingWalker(TopWalker):
+    DETERMINISTIC = True
+    calls = 0
+
+    def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+        CountingWalker.calls += 1
+        return super().select_branch(top_branch, bottom_branch)
+
+class TestDecisionTable(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    @number("14.1")
+    def test_matches_follow_path(self):
+        self.load_example()
+        for walker in (TopWalker, BottomWalker, LazyWalker, EasiestWalker, ShortestWalker):
+            for _ in range(2):
+                expected, actual = walker(), walker()
+                self.trail.follow_path(expected)
+                follow_compiled_path(self.trail, actual)
+                self.assertListEqual(actual.mountains, expected.mountains)
+
+        walker = TopWalker()
+        follow_compiled_path(Trail(None), walker)
+        self.assertListEqual(walker.mountains, [])
+
+    @number("14.2")
+    def test_probes_once_and_invalidates(self):
+        self.load_example()
+        CountingWalker.calls = 0
+        table = decision_table(self.trail, CountingWalker())
+        # Only the two splits on the top route are probed.
+        self.assertEqual(CountingWalker.calls, 2)
+        for _ in range(3):
+            follow_compiled_path(self.trail, CountingWalker())
+        self.assertEqual(CountingWalker.calls, 2)
+        self.assertIs(decision_table(self.trail, CountingWalker()), table)
+
+        # Make the top branch empty, which drops the cached table.
+        self.trail.store.path_top.store = None
+        walker = CountingWalker()
+        follow_compiled_path(self.trail, walker)
+        self.assertEqual(CountingWalker.calls, 3)
+        self.assertListEqual(walker.mountains, [self.final])
+
+        # Changing a mountain changes LazyWalker's choice at the nested split.
+        self.trail.store.path_top.store = TrailSplit(
+            Trail(TrailSeries(self.top_top, Trail(None))),
+            Trail(TrailSeries(self.top_bot, Trail(None))),
+            Trail(None),
+        )
+        walker = LazyWalker()
+        follow_compiled_path(self.trail, walker)
+        self.assertListEqual(walker.mountains, [self.top_bot, self.final])
+        self.top_bot.difficulty_level = 9
+        walker = LazyWalker()
+        follow_compiled_path(self.trail, walker)
+        self.assertListEqual(walker.mountains, [self.top_top, self.final])
+
+    @number("14.3")
+    def test_parametrised_personalities_are_not_shared(self):
+        self.load_example()
+        top, bottom = ReplayWalker([True, True]), ReplayWalker([False, False])
+        follow_compiled_path(self.trail, top)
+        follow_compiled_path(self.trail, bottom)
+        self.assertListEqual(top.mountains, [self.top_top, self.top_mid, self.final])
+        self.assertListEqual(bottom.mountains, [self.bot_one, self.final])
+        self.assertIsNot(decision_table(self.trail, ReplayWalker([True, True])), decision_table(self.trail, ReplayWalker([True, True])))
+
+    @number("14.4")
+    def test_subclasses_opt_in_and_add_mountain_is_called(self):
+        self.load_example()
+
+        class AlternatingWalker(TopWalker):
+            def __init__(self, top: bool) -> None:
+                super().__init__()
+                self.top = top
+
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+                return self.top
+
+        # Inherits DETERMINISTIC from TopWalker without setting it, so no table is shared.
+        top, bottom = AlternatingWalker(True), AlternatingWalker(False)
+        follow_compiled_path(self.trail, top)
+        follow_compiled_path(self.trail, bottom)
+        self.assertListEqual(top.mountains, [self.top_top, self.top_mid, self.final])
+        self.assertListEqual(bottom.mountains, [self.bot_one, self.final])
+
+        class NamingWalker(TopWalker):
+            DETERMINISTIC = True
+
+            def add_mountain(self, mountain: Mountain) -> None:
+                self.mountains.append(mountain.name)
+
+        walker = NamingWalker()
+        follow_compiled_path(self.trail, walker)
+        self.assertListEqual(walker.mountains, ["top-top", "top-mid", "final"])
+
+    @number("14.5")
+    def test_stateful_personalities_walk_as_follow_path(self):
+        self.load_example()
+
+        class TiringWalker(WalkerPersonality):
+            """Takes the top branch until it has walked a mountain."""
+
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+                return not self.mountains
+
+        # The outer split is taken before any mountain, the inner one after bot-one.
+        trail = Trail(TrailSeries(self.bot_one, self.trail))
+        expected, actual = TiringWalker(), TiringWalker()
+        trail.follow_path(expected)
+        follow_compiled_path(trail, actual)
+        self.assertListEqual(expected.mountains, [self.bot_one, self.bot_one, self.final])
+        self.assertListEqual(actual.mountains, expected.mountains)
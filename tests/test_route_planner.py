@@ -0,0 +1,77 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from personality import ReplayWalker
+from route_planner import best_route, best_routes, k_best_routes, route_value
+
+class TestRoutePlanner(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    @number("13.1")
+    def test_best_route(self):
+        self.load_example()
+
+        route = best_route(self.trail)
+        self.assertEqual(route.score, 6)
+        # Taking bot-two costs nothing, so both bottom routes are best.
+        self.assertIn(route.choices, [[False, True], [False, False]])
+        self.assertIs(route.mountains[0], self.bot_one)
+
+        shortest = best_route(self.trail, "length")
+        self.assertEqual(shortest.score, 9)
+        self.assertListEqual(shortest.choices, [False, False])
+        self.assertListEqual(shortest.mountains, [self.bot_one, self.final])
+
+        longest = best_route(self.trail, "length", maximise=True)
+        self.assertEqual(longest.score, 16)
+        self.assertListEqual(longest.mountains, [self.top_bot, self.top_mid, self.final])
+        self.assertEqual(route_value(self.trail, "length", maximise=True), 16)
+
+        with self.assertRaises(ValueError):
+            best_route(self.trail, "name")
+
+    @number("13.2")
+    def test_k_best_routes(self):
+        self.load_example()
+
+        routes = k_best_routes(self.trail, 10)
+        self.assertListEqual([route.score for route in routes], [6, 6, 11, 13])
+        for route in routes:
+            walker = ReplayWalker(route.choices)
+            self.trail.follow_path(walker)
+            self.assertListEqual(walker.mountains, route.mountains)
+            self.assertEqual(sum(m.difficulty_level for m in route.mountains), route.score)
+
+        # Routes are produced lazily, so huge trails are fine as long as we only want a few.
+        big = Trail(None)
+        for i in range(200):
+            big = Trail(TrailSplit(
+                Trail(TrailSeries(Mountain(f"a{i}", i % 7, 1), Trail(None))),
+                Trail(TrailSeries(Mountain(f"b{i}", i % 5, 1), Trail(None))),
+                big,
+            ))
+        first_three = list(zip(range(3), best_routes(big)))
+        self.assertEqual(first_three[0][1].score, route_value(big))
+        self.assertLessEqual(first_three[1][1].score, first_three[2][1].score)
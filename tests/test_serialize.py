@@ -0,0 +1,212 @@
+import dataclasses
+import gzip
+import io
+import json
+import os
+import tempfile
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from serialize import serialize, write_trail, deserialize, load_trail, save_store, load_store, detect_codec
+from trail_factory import TrailFactory
+
+# The reference format for write_trail, after
+# https://stackoverflow.com/questions/51286748/make-the-python-json-encoder-support-pythons-new-dataclasses
+class ReferenceEncoder(json.JSONEncoder):
+    def default(self, o):
+        if dataclasses.is_dataclass(o):
+            res = dataclasses.asdict(o)
+            self.remove_box(res)
+            return res
+        return super().default(o)
+
+    def remove_box(self, obj):
+        if isinstance(obj, dict):
+            rm_keys = list(filter(lambda x: x.endswith("_box"), obj.keys()))
+            for key in rm_keys:
+                del obj[key]
+            for key in obj.keys():
+                self.remove_box(obj[key])
+        if isinstance(obj, list):
+            for o in obj:
+                self.remove_box(o)
+
+class TestSerialize(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    @number("16.1")
+    def test_write_trail(self):
+        self.load_example()
+        for trail in (self.trail, Trail(None), self.trail.store.path_bottom):
+            out = io.StringIO()
+            write_trail(trail, out)
+            self.assertEqual(out.getvalue(), json.dumps(trail, cls=ReferenceEncoder))
+            self.assertEqual(serialize(trail), out.getvalue())
+
+        # Long chains are written without recursion.
+        long = Trail(None)
+        for i in range(20000):
+            long = Trail(TrailSeries(Mountain(f"m\"{i}", i, 1), long))
+        text = serialize(long)
+        self.assertTrue(text.startswith('{"store": {"mountain": {"name": "m\\"19999", "difficulty_level": 19999, "length": 1}'))
+        self.assertTrue(text.endswith('{"store": null}' + "}}" * 20000))
+
+    @number("16.2")
+    def test_load_trail(self):
+        self.load_example()
+        text = serialize(self.trail)
+        for chunk_size in (1, 7, 1 << 16):
+            trail = load_trail(io.StringIO(text), chunk_size=chunk_size)
+            self.assertEqual(trail, self.trail)
+            self.assertEqual(trail.store.path_top, self.trail.store.path_top)
+        self.assertEqual(deserialize(json.loads(text)), self.trail)
+        self.assertEqual(load_trail(io.StringIO(' {"store" : null}\n')), Trail(None))
+
+        with open("stores/basic.json") as f:
+            expected = deserialize(json.load(f))
+        with open("stores/basic.json") as f:
+            self.assertEqual(load_trail(f), expected)
+        factory = TrailFactory()
+        self.assertIs(load_trail(io.StringIO(text), factory).store.path_top.store.path_follow,
+                      deserialize(json.loads(text), factory).store.path_top.store.path_follow)
+
+        for bad in ('{"store": null', '{"store": null}}', '{"store": [1]}', '{"nope": 1}', '', '{"store": nul}'):
+            with self.assertRaises(ValueError):
+                load_trail(io.StringIO(bad))
+        # Anything json.loads rejects is rejected too.
+        for bad in (
+            '{"store" null}', '{"store": null} {"store": null}', '{"store": null,}', '{"store": null "x": 1}',
+            '{, "store": null}', '{"store":: null}', '{"store": null}]',
+        ):
+            self.assertRaises(json.JSONDecodeError, json.loads, bad)
+            with self.assertRaises(ValueError):
+                load_trail(io.StringIO(bad))
+
+        # Well-formed JSON holding the wrong kind of node is rejected too.
+        mountain, empty = '{"name": "a", "difficulty_level": 1, "length": 1}', '{"store": null}'
+        for bad in (
+            '{"store": 5}',
+            '{"store": %s}' % mountain,
+            '{"store": %s}' % empty,
+            '{"store": {"mountain": %s, "following": 5}}' % mountain,
+            '{"store": {"mountain": %s, "following": {"store": null}}}' % empty,
+            '{"store": {"mountain": %s, "following": %s}}' % (mountain, mountain),
+            '{"store": {"mountain": "a", "following": {"store": null}}}',
+            '{"store": {"path_top": %s, "path_bottom": %s, "path_follow": null}}' % (empty, empty),
+            '{"store": {"path_top": %s, "path_bottom": %s, "path_follow": %s}}' % (mountain, empty, empty),
+            '{"store": {"path_top": %s, "path_bottom": {"mountain": %s, "following": %s}, "path_follow": %s}}' % (empty, mountain, empty, empty),
+            mountain,
+        ):
+            with self.assertRaises(ValueError):
+                load_trail(io.StringIO(bad))
+            with self.assertRaises(ValueError):
+                deserialize(json.loads(bad))
+
+        # Deep trails load without recursion.
+        deep = Trail(None)
+        for i in range(3000):
+            deep = Trail(TrailSplit(Trail(None), Trail(TrailSeries(Mountain(f"é{i}", i, 1), Trail(None))), deep))
+        text = serialize(deep)
+        self.assertEqual(load_trail(io.StringIO(text), chunk_size=100), deep)
+
+    @number("16.4")
+    def test_mountain_table(self):
+        self.load_example()
+        same = Mountain("same", 1, 2)
+        trail = Trail(TrailSplit(
+            Trail(TrailSeries(same, Trail(None))),
+            Trail(TrailSeries(Mountain("same", 1, 2), Trail(TrailSeries(Mountain("other", 1, 2), Trail(None))))),
+            Trail(TrailSeries(same, Trail(None))),
+        ))
+        out = io.StringIO()
+        write_trail(trail, out, mountain_table=True)
+        text = out.getvalue()
+        obj = json.loads(text)
+        self.assertEqual(len(obj["mountains"]), 2)
+        self.assertEqual(text.count('"same"'), 1)
+        self.assertEqual(obj["trail"]["store"]["path_follow"]["store"]["mountain"], 0)
+
+        for chunk_size in (1, 7, 1 << 16):
+            self.assertEqual(load_trail(io.StringIO(text), chunk_size=chunk_size), trail)
+        self.assertEqual(deserialize(obj), trail)
+        # Without a factory every series still gets its own mountain.
+        mountains = list(load_trail(io.StringIO(text)).iter_mountains())
+        self.assertIsNot(mountains[0], mountains[1])
+        factory = TrailFactory()
+        mountains = list(load_trail(io.StringIO(text), factory).iter_mountains())
+        self.assertIs(mountains[0], mountains[1])
+
+        # Stores are saved with a table, and old stores without one still load.
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "t.json")
+            save_store(self.trail, path)
+            with open(path) as f:
+                self.assertIn("mountains", json.load(f))
+            self.assertEqual(load_store(path), self.trail)
+        with open("stores/basic.json") as f:
+            self.assertNotIn("mountains", json.load(f))
+        self.assertEqual(len(load_store("stores/basic.json").collect_all_mountains()), 4)
+
+        for bad in ('{"mountains": [1], "trail": {"store": null}}',
+                    '{"mountains": [], "trail": {"store": {"mountain": 0, "following": {"store": null}}}}',
+                    '{"store": {"mountain": 0, "following": {"store": null}}}',
+                    '{"mountains": []}', '[]'):
+            with self.assertRaises(ValueError):
+                load_trail(io.StringIO(bad))
+
+    @number("16.3")
+    def test_compressed_stores(self):
+        self.load_example()
+        with tempfile.TemporaryDirectory() as directory:
+            for codec, ext in (("gzip", ".gz"), ("bz2", ".bz2"), ("lzma", ".xz")):
+                for store in (".json", ".trail"):
+                    path = os.path.join(directory, "t" + store + ext)
+                    save_store(self.trail, path)
+                    self.assertEqual(detect_codec(path), codec)
+                    self.assertEqual(load_store(path), self.trail)
+                    self.assertEqual(load_store(path, lazy=True), self.trail)
+
+                    # Detection goes by content, not by name.
+                    renamed = os.path.join(directory, "renamed")
+                    os.replace(path, renamed)
+                    self.assertEqual(load_store(renamed), self.trail)
+
+                path = os.path.join(directory, "plain.trail")
+                save_store(self.trail, path, codec)
+                self.assertEqual(detect_codec(path), codec)
+                self.assertEqual(load_store(path), self.trail)
+
+            path = os.path.join(directory, "plain")
+            save_store(self.trail, path)
+            self.assertIsNone(detect_codec(path))
+            self.assertEqual(load_store(path), self.trail)
+            with gzip.open(path, "wb") as f:
+                f.write(b'{"store": ')
+            with self.assertRaises(ValueError):
+                load_store(path)
+            with open(path, "wb") as f:
+                f.write(b"\x1f\x8bnot gzip")
+            with self.assertRaises(ValueError):
+                load_store(path)
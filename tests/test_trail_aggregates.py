@@ -0,0 +1,59 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from trail_aggregates import aggregate, TrailAggregate, EMPTY_AGGREGATE
+
+class TestTrailAggregates(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    @number("12.1")
+    def test_aggregate(self):
+        self.load_example()
+
+        self.assertEqual(aggregate(self.trail), TrailAggregate(0, 5, 24, 6, 2, 3))
+        self.assertEqual(aggregate(self.trail.store.path_top), TrailAggregate(3, 5, 15, 3, 1, 1))
+        self.assertEqual(aggregate(self.trail.store.path_follow.store), TrailAggregate(4, 4, 4, 1, 0, 0))
+        self.assertIs(aggregate(Trail(None)), EMPTY_AGGREGATE)
+
+    @number("12.2")
+    def test_updates_after_edits(self):
+        self.load_example()
+        aggregate(self.trail)
+        untouched = aggregate(self.trail.store.path_top)
+
+        bottom = self.trail.store.path_bottom.store.following
+        bottom.store = bottom.store.remove_branch()
+        self.assertEqual(aggregate(self.trail), TrailAggregate(2, 5, 24, 5, 2, 2))
+        # Only the path back to the root was recomputed.
+        self.assertIs(aggregate(self.trail.store.path_top), untouched)
+
+        self.final.difficulty_level = 9
+        self.assertEqual(aggregate(self.trail).max_difficulty, 9)
+
+        # Long series do not hit the recursion limit.
+        long_trail = Trail(None)
+        for i in range(5000):
+            long_trail = long_trail.add_mountain_before(Mountain(str(i), i, 1))
+        self.assertEqual(aggregate(long_trail), TrailAggregate(0, 4999, 5000, 5000, 0, 0))
@@ -0,0 +1,58 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from trail_factory import TrailFactory
+
+class TestTrailFactory(unittest.TestCase):
+
+    def make_trail(self):
+        a, b = Mountain("a", 1, 2), Mountain("b", 3, 4)
+        return Trail(TrailSplit(
+            Trail(TrailSeries(a, Trail(TrailSeries(b, Trail(None))))),
+            Trail(TrailSeries(a, Trail(TrailSeries(b, Trail(None))))),
+            Trail(TrailSeries(a, Trail(None))),
+        ))
+
+    @number("9.1")
+    def test_structural_hash(self):
+        t1, t2 = self.make_trail(), self.make_trail()
+        self.assertEqual(t1.structural_hash(), t2.structural_hash())
+        self.assertEqual(t1, t2)
+        self.assertEqual(t1.store.path_top, t1.store.path_bottom)
+        self.assertNotEqual(t1.store.path_top, t1.store.path_follow)
+
+        # Edits through assignment drop the cached hashes back to the root.
+        t2.store.path_follow.store = t2.store.path_follow.store.add_mountain_after(Mountain("c", 0, 0))
+        self.assertNotEqual(t1, t2)
+        inner = t2.store.path_follow.store.following
+        inner.store = inner.store.remove_mountain()
+        self.assertEqual(t1, t2)
+
+        # So do edits to a mountain on the trail.
+        t2.store.path_top.store.mountain.length = 10
+        self.assertNotEqual(t1, t2)
+
+        # Rehashing after each edit registers the root with the untouched branch only once.
+        sibling = t2.store.path_bottom
+        for i in range(100):
+            t2.store.path_top.store.mountain = Mountain("d", i, 0)
+            t2.structural_hash()
+        self.assertIs(sibling._dependents(), t2.store)
+
+    @number("9.2")
+    def test_hash_consing(self):
+        factory = TrailFactory()
+        t1 = factory.intern(self.make_trail())
+        t2 = factory.intern(self.make_trail())
+
+        self.assertIs(t1, t2)
+        self.assertIs(t1.store.path_top, t1.store.path_bottom)
+        self.assertIs(t1.store.path_top.store.mountain, t1.store.path_follow.store.mountain)
+        self.assertEqual(t1, self.make_trail())
+        # 2 mountains, 3 series, 4 trails below the split, the split and the root.
+        self.assertEqual(len(factory), 11)
+
+        empty = factory.trail()
+        self.assertIs(factory.series(factory.mountain("b", 3, 4), empty), t1.store.path_top.store.following.store)
@@ -0,0 +1,62 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from trail_history import TrailHistory
+
+class TestTrailHistory(unittest.TestCase):
+
+    def load_example(self):
+        self.a, self.b, self.c = (Mountain(letter, 1, 1) for letter in "abc")
+        self.trail = Trail(TrailSeries(self.a, Trail(TrailSplit(
+            Trail(TrailSeries(self.b, Trail(None))),
+            Trail(None),
+            Trail(TrailSeries(self.c, Trail(None))),
+        ))))
+
+    @number("10.1")
+    def test_edits_share_structure(self):
+        self.load_example()
+        history = TrailHistory(self.trail)
+        d = Mountain("d", 2, 2)
+
+        v1 = history.add_mountain_after(("following", "path_top"), d)
+        self.assertEqual(len(history), 2)
+        self.assertListEqual([m.name for m in v1.collect_all_mountains()], ["a", "b", "d", "c"])
+        # The original is untouched, and the branches that did not change are shared.
+        self.assertListEqual([m.name for m in self.trail.collect_all_mountains()], ["a", "b", "c"])
+        self.assertIs(v1.store.following.store.path_follow, self.trail.store.following.store.path_follow)
+        self.assertIs(v1.store.following.store.path_bottom, self.trail.store.following.store.path_bottom)
+
+        v2 = history.remove_branch(("following",))
+        self.assertListEqual([m.name for m in v2.collect_all_mountains()], ["a", "c"])
+        v3 = history.add_empty_branch_before(())
+        self.assertIsInstance(v3.store, TrailSplit)
+        self.assertIs(v3.store.path_follow, v2)
+
+        with self.assertRaises(ValueError):
+            history.remove_mountain(("following",))
+        with self.assertRaises(ValueError):
+            history.add_mountain_before(("path_top", "following"), d)
+        self.assertEqual(len(history), 4)
+
+    @number("10.2")
+    def test_undo_redo(self):
+        self.load_example()
+        history = TrailHistory(self.trail)
+        history.remove_mountain(())
+        history.add_mountain_before(("path_bottom",), Mountain("e", 0, 0))
+
+        self.assertIs(history.undo(), history.version(1))
+        self.assertIs(history.undo(), self.trail)
+        with self.assertRaises(IndexError):
+            history.undo()
+        self.assertIs(history.redo(), history.version(1))
+        self.assertIs(history.checkout(2), history.current)
+
+        # Editing an older version drops the versions after it.
+        history.checkout(0)
+        history.remove_mountain(())
+        self.assertEqual(len(history), 2)
+        self.assertFalse(history.can_redo())
@@ -0,0 +1,95 @@
+import unittest
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from trail_index import TrailIndex
+from trail_factory import TrailFactory
+
+class TestTrailIndex(unittest.TestCase):
+
+    def load_example(self):
+        self.a, self.b, self.c = (Mountain(letter, 1, 1) for letter in "abc")
+        self.trail = Trail(TrailSeries(self.a, Trail(TrailSplit(
+            Trail(TrailSeries(self.b, Trail(None))),
+            Trail(None),
+            Trail(TrailSeries(self.c, Trail(None))),
+        ))))
+        self.index = TrailIndex(self.trail)
+
+    @number("11.1")
+    def test_lookups(self):
+        self.load_example()
+        split = self.trail.store.following.store
+
+        self.assertIn("b", self.index)
+        self.assertNotIn("d", self.index)
+        self.assertListEqual(self.index.where("a"), [(self.trail.store, self.trail)])
+        self.assertListEqual(self.index.locate(self.c), [(split.path_follow.store, split.path_follow)])
+        self.assertListEqual(self.index.find("b"), [split.path_top.store])
+
+    @number("11.2")
+    def test_follows_edits(self):
+        self.load_example()
+        split_trail = self.trail.store.following
+        d = Mountain("d", 2, 2)
+
+        split_trail.store.path_bottom.store = Trail(None).add_mountain_before(d).store
+        self.assertListEqual(self.index.where("d"), [(split_trail.store.path_bottom.store, split_trail.store.path_bottom)])
+
+        series, trail = self.index.where("b")[0]
+        trail.store = series.add_mountain_before(Mountain("e", 0, 0))
+        # b now sits in the new trail after e.
+        self.assertIs(self.index.where("b")[0][1], trail.store.following)
+
+        split_trail.store = split_trail.store.remove_branch()
+        for name in "bde":
+            self.assertNotIn(name, self.index)
+        self.assertListEqual(self.index.where("c"), [(split_trail.store, split_trail)])
+
+        self.c.name = "renamed"
+        self.assertNotIn("c", self.index)
+        self.assertListEqual(self.index.find("renamed"), [split_trail.store])
+
+        self.assertEqual(self.index.remove_mountain("a"), 1)
+        self.assertIs(self.trail.store, split_trail.store)
+        self.assertEqual(self.index.edit_mountain("renamed", d), 1)
+        self.assertListEqual([m.name for m in self.trail.collect_all_mountains()], ["d"])
+        self.assertEqual(set(self.index.by_name), {"d"})
+
+    @number("11.3")
+    def test_shared_subtrees(self):
+        self.load_example()
+        trail = TrailFactory().intern(Trail(TrailSplit(
+            Trail(TrailSeries(self.a, Trail(None))),
+            Trail(TrailSeries(self.a, Trail(None))),
+            Trail(None),
+        )))
+        index = TrailIndex(trail)
+        self.assertEqual(len(index.find("a")), 1)
+        self.assertEqual(len(index.where("a")), 1)
+        trail.store.path_top = Trail(None)
+        self.assertIn("a", index)
+        trail.store.path_bottom = Trail(None)
+        self.assertNotIn("a", index)
+
+    @number("11.4")
+    def test_remove_and_edit_runs(self):
+        x = [Mountain("x", i, 1) for i in range(4)]
+        trail = Trail(None)
+        for mountain in x[:2] + [Mountain("y", 0, 0)] + x[2:]:
+            trail = trail.add_mountain_before(mountain)
+        index = TrailIndex(trail)
+
+        # Runs of the same name are removed whole.
+        self.assertEqual(index.remove_mountain("x"), 4)
+        self.assertListEqual([m.name for m in trail.collect_all_mountains()], ["y"])
+        self.assertEqual(set(index.by_name), {"y"})
+
+        trail.store = trail.store.add_mountain_after(Mountain("y", 1, 1))
+        z = Mountain("z", 5, 5)
+        self.assertEqual(index.edit_mountain("y", z), 2)
+        first, second = (series.mountain for series in index.find("z"))
+        self.assertIsNot(first, second)
+        first.length = 9
+        self.assertEqual(second.length, 5)
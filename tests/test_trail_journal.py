@@ -0,0 +1,243 @@
+import os
+import tempfile
+import time
+import unittest
+from unittest import mock
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from personality import TopWalker
+from trail import Trail, TrailSeries, TrailSplit
+from serialize import save_store, load_store
+from trail_journal import TrailJournal, load_journaled, save_journaled, journal_path, _checksum, _header
+
+def records(path):
+    """The records in a store's journal, less its header."""
+    with open(journal_path(path)) as f:
+        return [line for line in f if not line.startswith('{"snapshot"')]
+
+class TestTrailJournal(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    def edit(self, n):
+        """Makes a few edits the way draw_trails does."""
+        root = self.trail
+        root.store = TrailSeries(Mountain(f"new-{n}", n, 1), Trail(root.store))
+        split = root.store
+        while isinstance(split, TrailSeries):
+            split = split.following.store
+        bottom = split.path_bottom
+        bottom.store = bottom.store.add_mountain_after(Mountain(f"after-{n}", 1, n))
+        follow = split.path_follow
+        follow.store = TrailSplit(Trail(None), Trail(None), Trail(follow.store))
+        self.final.difficulty_level += 1
+
+    @number("18.1")
+    def test_save_and_replay(self):
+        for ext in (".json", ".trail"):
+            self.load_example()
+            with tempfile.TemporaryDirectory() as directory:
+                path = os.path.join(directory, "t" + ext)
+                save_store(self.trail, path)
+                size = os.path.getsize(path)
+                journal = TrailJournal(self.trail, path)
+                self.edit(1)
+                inner = self.trail.store.following.store.path_top
+                inner.store = inner.store.remove_branch()
+                self.top_mid.name = "renamed"
+                inner.store.following.store = None
+                journal.save()
+                journal.close()
+
+                # The snapshot is untouched and the journal only holds the edits.
+                self.assertEqual(os.path.getsize(path), size)
+                self.assertEqual(len(records(path)), 7)
+                loaded = load_journaled(path)
+                self.assertEqual(loaded, self.trail)
+                self.assertNotEqual(load_store(path), self.trail)
+
+                # Journalling carries on from a loaded trail.
+                self.trail = loaded
+                journal = TrailJournal(loaded, path)
+                self.edit(2)
+                journal.save()
+                journal.close()
+                self.assertEqual(load_journaled(path), loaded)
+                self.assertEqual(load_journaled(path, lazy=True), loaded)
+
+                save_journaled(loaded, path)
+                self.assertEqual(records(path), [])
+                self.assertEqual(load_store(path), loaded)
+
+    @number("18.2")
+    def test_compaction(self):
+        self.load_example()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "t.json")
+            save_store(self.trail, path)
+            journal = TrailJournal(self.trail, path, compact_after=10)
+            for n in range(5):
+                self.edit(n)
+                journal.save()
+            journal.wait()
+            self.edit(5)
+            journal.save()
+            journal.close()
+            self.assertLessEqual(len(records(path)), 12)
+            self.assertEqual(load_journaled(path), self.trail)
+
+            journal = TrailJournal(self.trail, path)
+            journal.compact(wait=True)
+            journal.close()
+            self.assertEqual(records(path), [])
+            self.assertEqual(load_store(path), self.trail)
+
+            # An interrupted compaction is undone by the next writer, but loading leaves it alone.
+            journal = TrailJournal(self.trail, path)
+            self.edit(6)
+            journal.save()
+            journal.close()
+            snapshot_tmp, journal_next = os.path.join(directory, ".compacting.t.json"), journal_path(path) + ".next"
+            for leftover in (snapshot_tmp, journal_next):
+                with open(leftover, "w") as f:
+                    f.write("garbage")
+            self.assertEqual(load_journaled(path), self.trail)
+            self.assertTrue(os.path.exists(journal_next))
+            TrailJournal(self.trail, path).close()
+            self.assertFalse(os.path.exists(journal_next))
+            self.assertFalse(os.path.exists(snapshot_tmp))
+            self.assertEqual(load_journaled(path), self.trail)
+
+            # One interrupted after the snapshot was replaced is finished, and loads see the new journal.
+            journal = TrailJournal(self.trail, path)
+            self.edit(7)
+            journal.save()
+            journal.close()
+            save_store(self.trail, snapshot_tmp)
+            os.replace(snapshot_tmp, path)
+            with open(journal_next, "w") as f:
+                f.write(_header(_checksum(path)))
+            self.assertEqual(load_journaled(path), self.trail)
+            save_journaled(self.trail, path)
+            self.assertFalse(os.path.exists(journal_next))
+            self.assertEqual(load_journaled(path), self.trail)
+
+
+    @number("18.3")
+    def test_concurrent_loads(self):
+        self.load_example()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "t.trail")
+            save_store(self.trail, path)
+            journal = TrailJournal(self.trail, path, compact_after=3)
+            for n in range(20):
+                self.edit(n)
+                journal.save()
+                # Loads during a compaction see every saved edit and leave the files alone.
+                self.assertEqual(load_journaled(path), self.trail)
+            journal.close()
+            self.assertEqual(load_journaled(path), self.trail)
+            self.assertListEqual(sorted(os.listdir(directory)), ["t.trail", "t.trail.journal"])
+
+            # A lock held by a live process is respected, one left by a dead process is taken over.
+            lock = os.path.join(directory, ".compacting.t.trail.lock")
+            journal_next = journal_path(path) + ".next"
+            for pid, expected in ((os.getpid(), True), (2 ** 22 + 1, False)):
+                with open(lock, "w") as f:
+                    f.write(str(pid))
+                with open(journal_next, "w") as f:
+                    f.write("garbage")
+                TrailJournal(self.trail, path).close()
+                self.assertEqual(os.path.exists(journal_next), expected)
+                self.assertEqual(os.path.exists(lock), expected)
+
+    @number("18.4")
+    def test_failed_compaction(self):
+        self.load_example()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "t.json")
+            save_store(self.trail, path)
+            journal = TrailJournal(self.trail, path)
+            self.edit(1)
+            journal.save()
+            with mock.patch("trail_journal.save_store", side_effect=OSError("disk full")):
+                journal.compact(wait=True)
+            self.edit(2)
+            with self.assertRaises(OSError):
+                journal.save()
+            self.assertEqual(sorted(os.listdir(directory)), ["t.json", "t.json.journal"])
+            # The edits were kept, and the next save writes them.
+            journal.save()
+            journal.close()
+            self.assertEqual(load_journaled(path), self.trail)
+
+    @number("18.5")
+    def test_stale_journal(self):
+        self.load_example()
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "t.json")
+            save_store(self.trail, path)
+            journal = TrailJournal(self.trail, path)
+            self.edit(1)
+            journal.save()
+            journal.close()
+
+            # Replacing the snapshot by hand leaves a journal that no longer fits it.
+            self.load_example()
+            self.final.length = 0
+            save_store(self.trail, path)
+            start = time.monotonic()
+            with self.assertRaises(ValueError):
+                load_journaled(path, timeout=60)
+            self.assertLess(time.monotonic() - start, 30)
+
+            # Journalling the new snapshot starts the journal afresh.
+            journal = TrailJournal(self.trail, path)
+            self.edit(2)
+            journal.save()
+            journal.close()
+            self.assertEqual(load_journaled(path), self.trail)
+
+    @number("18.6")
+    def test_shared_nodes(self):
+        a, b = Mountain("a", 1, 1), Mountain("b", 2, 2)
+        shared = Trail(TrailSeries(a, Trail(None)))
+        self.trail = Trail(TrailSeries(b, Trail(TrailSplit(shared, Trail(None), shared))))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "t.json")
+            save_store(self.trail, path)
+            journal = TrailJournal(self.trail, path)
+            # Both edits reach the two places the shared trail sits.
+            shared.store = shared.store.add_mountain_after(b)
+            a.name = "c"
+            journal.save()
+            journal.close()
+
+            walker = TopWalker()
+            self.trail.follow_path(walker)
+            self.assertListEqual([m.name for m in walker.mountains], ["b", "c", "b", "c", "b"])
+            loaded = load_journaled(path)
+            self.assertEqual(loaded, self.trail)
+            walker = TopWalker()
+            loaded.follow_path(walker)
+            self.assertListEqual([m.name for m in walker.mountains], ["b", "c", "b", "c", "b"])
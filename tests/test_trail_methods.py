@@ -57,3 +57,66 @@ class TestTrailMethods(unittest.TestCase):
             self.top_bot, self.top_top, self.top_mid,
             self.bot_one, self.bot_two, self.final
         ])))
+
+    @number("7.2")
+    def test_iter_mountains(self):
+        self.load_example()
+
+        res = list(self.trail.iter_mountains())
+        self.assertListEqual(res, [
+            self.top_top, self.top_bot, self.top_mid,
+            self.bot_one, self.bot_two, self.final
+        ])
+        self.assertListEqual(self.trail.collect_all_mountains(), res)
+
+        # Long series should not hit the recursion limit.
+        long_trail = Trail(None)
+        for i in range(10000):
+            long_trail = long_trail.add_mountain_before(Mountain(str(i), 1, 1))
+        self.assertEqual(len(long_trail.collect_all_mountains()), 10000)
+
+    @number("7.3")
+    def test_count_paths(self):
+        self.load_example()
+
+        self.assertListEqual(self.trail.path_length_histogram(), [0, 0, 1, 3])
+        for k in range(6):
+            self.assertEqual(self.trail.count_length_k_paths(k), len(self.trail.length_k_paths(k)))
+        self.assertEqual(Trail(None).count_length_k_paths(0), 1)
+        self.assertEqual(self.trail.count_length_k_paths(-1), 0)
+
+        paths = self.trail.iter_length_k_paths(3)
+        self.assertListEqual(next(paths), [self.top_top, self.top_mid, self.final])
+
+        # 20 splits in series give 2^20 paths, which we can count without listing them.
+        big = Trail(None)
+        for i in range(20):
+            big = Trail(TrailSplit(Trail(TrailSeries(self.top_top, Trail(None))), Trail(None), big))
+        self.assertEqual(big.count_length_k_paths(10), 184756)
+        self.assertEqual(sum(big.path_length_histogram()), 2 ** 20)
+
+    @number("7.4")
+    def test_sample_paths(self):
+        self.load_example()
+
+        all_paths = self.trail.length_k_paths(2) + self.trail.length_k_paths(3)
+        samples = self.trail.sample_paths(200, seed=1)
+        self.assertEqual(len(samples), 200)
+        for path in samples:
+            self.assertIn(path, all_paths)
+        # Every one of the 4 paths should turn up.
+        self.assertEqual(len({tuple(m.name for m in path) for path in samples}), 4)
+
+        for path in self.trail.sample_paths(50, k=3, seed=2):
+            self.assertIn(path, self.trail.length_k_paths(3))
+        self.assertListEqual(self.trail.sample_paths(2, k=2, seed=3), [[self.bot_one, self.final]] * 2)
+        self.assertEqual(self.trail.sample_paths(5, seed=4), self.trail.sample_paths(5, seed=4))
+        with self.assertRaises(ValueError):
+            self.trail.sample_paths(1, k=4)
+
+        # Shorter than the series the trail starts with.
+        two = Trail(None).add_mountain_before(self.final).add_mountain_before(self.top_top)
+        self.assertListEqual(two.sample_paths(1, k=2), [[self.top_top, self.final]])
+        for k in (-1, 0, 1):
+            with self.assertRaises(ValueError):
+                two.sample_paths(1, k=k)
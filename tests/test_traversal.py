@@ -2,8 +2,14 @@ import unittest
 from ed_utils.decorators import number
 
 from mountain import Mountain
-from trail import Trail, TrailSeries, TrailSplit, TrailStore
-from personality import WalkerPersonality, TopWalker, BottomWalker, LazyWalker
+from trail import Trail, TrailSeries, TrailSplit, TrailStore, WalkTrace, replay, walk_many
+from personality import WalkerPersonality, TopWalker, BottomWalker, LazyWalker, EasiestWalker, ShortestWalker, RandomWalker
+
+class TiringWalker(WalkerPersonality):
+    """Takes the top branch until it has walked two mountains."""
+
+    def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+        return len(self.mountains) < 2
 
 class TestTrailMethods(unittest.TestCase):
 
@@ -59,3 +65,174 @@ class TestTrailMethods(unittest.TestCase):
         self.trail.follow_path(cw)
 
         self.assertListEqual(cw.mountains, [self.bot_one, self.bot_two, self.final])
+
+    @number("2.3")
+    def test_follow_paths(self):
+        class CustomWalker(WalkerPersonality):
+            def __init__(self, choices) -> None:
+                super().__init__()
+                self.choices = list(choices)
+            def select_branch(self, top_branch: Trail, bottom_branch: Trail) -> bool:
+                return self.choices.pop(0)
+
+        self.load_example()
+        walkers = [TopWalker(), BottomWalker(), LazyWalker(), CustomWalker([False, True]), TopWalker()]
+        self.trail.follow_paths(walkers)
+
+        self.assertListEqual(walkers[0].mountains, [self.top_top, self.top_mid, self.final])
+        self.assertListEqual(walkers[1].mountains, [self.bot_one, self.final])
+        self.assertListEqual(walkers[2].mountains, [self.top_bot, self.top_mid, self.final])
+        self.assertListEqual(walkers[3].mountains, [self.bot_one, self.bot_two, self.final])
+        self.assertListEqual(walkers[4].mountains, walkers[0].mountains)
+
+    @number("2.4")
+    def test_walk_many(self):
+        self.load_example()
+        walkers = [walker() for _ in range(50) for walker in (TopWalker, BottomWalker, LazyWalker)]
+
+        self.assertIs(walk_many(self.trail, walkers, workers=4), walkers)
+        for walker in walkers:
+            expected = type(walker)()
+            self.trail.follow_path(expected)
+            self.assertListEqual(walker.mountains, expected.mountains)
+        # Walking leaves nothing behind on the trail.
+        self.assertNotIn("s1", vars(self.trail))
+
+    @number("2.5")
+    def test_lookahead_walkers(self):
+        self.load_example()
+        ew, sw = EasiestWalker(), ShortestWalker()
+        self.trail.follow_path(ew)
+        self.trail.follow_path(sw)
+        self.assertListEqual(ew.mountains, [self.bot_one, self.bot_two, self.final])
+        self.assertListEqual(sw.mountains, [self.bot_one, self.bot_two, self.final])
+
+        # The top branch gets easier once its hardest mountain is made easy.
+        self.top_mid.difficulty_level = -10
+        ew = EasiestWalker()
+        self.trail.follow_path(ew)
+        self.assertListEqual(ew.mountains, [self.top_bot, self.top_mid, self.final])
+
+        # Thousands of nested splits, each branch scored once.
+        deep = Trail(None)
+        for i in range(3000):
+            deep = Trail(TrailSplit(
+                Trail(TrailSeries(Mountain(str(i), i % 3, 1), deep)),
+                Trail(TrailSeries(Mountain(str(i), 1, i % 4), deep)),
+                Trail(None),
+            ))
+        ew = EasiestWalker()
+        deep.follow_path(ew)
+        self.assertEqual(len(ew.mountains), 3000)
+        self.assertEqual(sum(m.difficulty_level for m in ew.mountains), sum(min(i % 3, 1) for i in range(3000)))
+
+    @number("2.6")
+    def test_trace_and_replay(self):
+        self.load_example()
+        for walker in (TopWalker(), BottomWalker(), LazyWalker()):
+            trace = self.trail.follow_path(walker, trace=True)
+            self.assertEqual(trace.splits, 2)
+            self.assertEqual(len(trace.fingerprint), 16)
+            self.assertListEqual(replay(self.trail, trace), walker.mountains)
+            self.assertEqual(WalkTrace.from_bytes(bytes(trace)), trace)
+        self.assertIsNone(self.trail.follow_path(TopWalker()))
+        self.assertEqual(self.trail.follow_path(TopWalker(), trace=True).bits, b"\x03")
+
+        # A long random walk packs one bit per split.
+        deep = Trail(None)
+        for i in range(1000):
+            deep = Trail(TrailSplit(
+                Trail(TrailSeries(Mountain(str(i), 1, 1), Trail(None))),
+                Trail(None),
+                deep,
+            ))
+        walker = RandomWalker(seed=5)
+        trace = deep.follow_path(walker, trace=True)
+        self.assertEqual(len(bytes(trace)), 20 + 125)
+        self.assertListEqual(replay(deep, trace), walker.mountains)
+
+        with self.assertRaises(ValueError):
+            replay(self.trail, trace)
+        with self.assertRaises(ValueError):
+            WalkTrace.from_bytes(bytes(trace)[:-1])
+        trace = self.trail.follow_path(TopWalker(), trace=True)
+        # Editing a mountain off the route leaves the trace valid, but not one on it.
+        self.bot_one.length = 10
+        self.assertListEqual(replay(self.trail, trace), [self.top_top, self.top_mid, self.final])
+        self.top_top.length = 10
+        with self.assertRaises(ValueError):
+            replay(self.trail, trace)
+
+    @number("2.7")
+    def test_iter_path(self):
+        self.load_example()
+        for walker in (TopWalker(), BottomWalker(), LazyWalker()):
+            expected = walker.__class__()
+            self.trail.follow_path(expected)
+            self.assertListEqual(list(self.trail.iter_path(walker)), expected.mountains)
+            self.assertListEqual(walker.mountains, [])
+
+        class CountingWalker(TopWalker):
+            def __init__(self):
+                super().__init__()
+                self.calls = 0
+            def select_branch(self, top_branch, bottom_branch):
+                self.calls += 1
+                return super().select_branch(top_branch, bottom_branch)
+
+        # Stopping at the first mountain only asks about the splits before it.
+        walker = CountingWalker()
+        self.assertIs(next(self.trail.iter_path(walker)), self.top_top)
+        self.assertEqual(walker.calls, 2)
+
+        choices = []
+        path = self.trail.iter_path(BottomWalker(), choices)
+        self.assertIs(next(m for m in path if m.difficulty_level > 1), self.bot_one)
+        self.assertListEqual(choices, [False])
+        self.assertListEqual(list(path), [self.final])
+        self.assertListEqual(choices, [False, False])
+        self.assertListEqual(list(Trail(None).iter_path(TopWalker())), [])
+
+    @number("2.8")
+    def test_walk_within_budget(self):
+        self.load_example()
+        walker = TopWalker()
+        walk = self.trail.walk_within_budget(walker, max_length=10)
+        self.assertListEqual(walk.mountains, [self.top_top, self.top_mid])
+        self.assertListEqual(walker.mountains, walk.mountains)
+        self.assertEqual((walk.length_left, walk.difficulty_left), (0, None))
+
+        walk = self.trail.walk_within_budget(BottomWalker(), max_length=20, max_difficulty=5)
+        self.assertListEqual(walk.mountains, [self.bot_one])
+        self.assertEqual((walk.length_left, walk.difficulty_left), (15, 3))
+        walk = self.trail.walk_within_budget(BottomWalker())
+        self.assertListEqual(walk.mountains, [self.bot_one, self.final])
+        self.assertEqual((walk.length_left, walk.difficulty_left), (None, None))
+        self.assertListEqual(self.trail.walk_within_budget(TopWalker(), max_difficulty=4).mountains, [])
+
+        # A long run is cut by binary search, and re-cut after an edit.
+        mountains = [Mountain(str(i), 1, 2) for i in range(1000)]
+        long = Trail(None)
+        for m in reversed(mountains):
+            long = Trail(TrailSeries(m, long))
+        walk = long.walk_within_budget(TopWalker(), max_length=1001)
+        self.assertEqual(len(walk.mountains), 500)
+        self.assertEqual(walk.length_left, 1)
+        mountains[10].length = 600
+        walk = long.walk_within_budget(TopWalker(), max_length=1001)
+        self.assertEqual(len(walk.mountains), 201)
+        mountains[3].length = -600
+        walk = long.walk_within_budget(TopWalker(), max_length=10)
+        self.assertListEqual(walk.mountains, mountains[:10])
+        self.assertEqual(walk.length_left, 592)
+
+        # Each run is added before the next split, so a personality sees what it has walked.
+        a, b, top, bottom = (Mountain(name, 1, 1) for name in ("a", "b", "top", "bottom"))
+        trail = Trail(TrailSeries(a, Trail(TrailSeries(b, Trail(TrailSplit(
+            Trail(TrailSeries(top, Trail(None))), Trail(TrailSeries(bottom, Trail(None))), Trail(None)
+        ))))))
+        expected, walker = TiringWalker(), TiringWalker()
+        trail.follow_path(expected)
+        self.assertListEqual(expected.mountains, [a, b, bottom])
+        self.assertListEqual(trail.walk_within_budget(walker).mountains, expected.mountains)
+        self.assertListEqual(walker.mountains, expected.mountains)
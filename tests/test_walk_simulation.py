@@ -0,0 +1,70 @@
+import unittest
+from importlib.util import find_spec
+from ed_utils.decorators import number
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit
+from personality import RandomWalker, TopWalker, BottomWalker
+
+class TestWalkSimulation(unittest.TestCase):
+
+    def load_example(self):
+        self.top_top = Mountain("top-top", 5, 3)
+        self.top_bot = Mountain("top-bot", 3, 5)
+        self.top_mid = Mountain("top-mid", 4, 7)
+        self.bot_one = Mountain("bot-one", 2, 5)
+        self.bot_two = Mountain("bot-two", 0, 0)
+        self.final   = Mountain("final", 4, 4)
+        self.trail = Trail(TrailSplit(
+            Trail(TrailSplit(
+                Trail(TrailSeries(self.top_top, Trail(None))),
+                Trail(TrailSeries(self.top_bot, Trail(None))),
+                Trail(TrailSeries(self.top_mid, Trail(None))),
+            )),
+            Trail(TrailSeries(self.bot_one, Trail(TrailSplit(
+                Trail(TrailSeries(self.bot_two, Trail(None))),
+                Trail(None),
+                Trail(None),
+            )))),
+            Trail(TrailSeries(self.final, Trail(None)))
+        ))
+
+    @number("15.1")
+    def test_random_walker(self):
+        self.load_example()
+        paths = []
+        for _ in range(2):
+            walker = RandomWalker(seed=7)
+            for _ in range(20):
+                self.trail.follow_path(walker)
+            paths.append(walker.mountains)
+        self.assertListEqual(paths[0], paths[1])
+
+        for p_top, walker in ((1, TopWalker()), (0, BottomWalker())):
+            expected, actual = walker, RandomWalker(p_top)
+            self.trail.follow_path(expected)
+            self.trail.follow_path(actual)
+            self.assertListEqual(actual.mountains, expected.mountains)
+
+    @number("15.2")
+    @unittest.skipIf(find_spec("numpy") is None, "NumPy is not installed")
+    def test_simulate_walks(self):
+        from walk_simulation import simulate_walks
+        self.load_example()
+
+        result = simulate_walks(self.trail, 10000, seed=1)
+        visits = dict((m.name, count) for m, count in result.visit_counts())
+        self.assertEqual(visits["final"], 10000)
+        self.assertEqual(visits["top-mid"] + visits["bot-one"], 10000)
+        self.assertEqual(visits["top-top"] + visits["top-bot"], visits["top-mid"])
+        self.assertAlmostEqual(visits["top-mid"] / 10000, 0.5, delta=0.03)
+        self.assertAlmostEqual(visits["bot-two"] / visits["bot-one"], 0.5, delta=0.03)
+        self.assertEqual(result.path_lengths.sum(), 10000)
+        self.assertEqual((result.path_lengths * range(len(result.path_lengths))).sum(), result.visits.sum())
+        self.assertListEqual(list(result.path_lengths[:2]), [0, 0])
+
+        self.assertListEqual(list(simulate_walks(self.trail, 100, seed=3).visits), list(simulate_walks(self.trail, 100, seed=3).visits))
+        top = simulate_walks(self.trail, 5, RandomWalker(1))
+        self.assertListEqual([m.name for m, count in top.visit_counts() if count], ["top-top", "top-mid", "final"])
+        self.assertListEqual(list(top.path_lengths), [0, 0, 0, 5])
+        self.assertListEqual(list(simulate_walks(Trail(None), 4).path_lengths), [4])
@@ -0,0 +1,157 @@
+"""
+Edit tracking for trail nodes.
+
+Trails are edited by assigning new values to the fields of their nodes
+(see draw_trails.TrailDraw.box_and_action). TrackedNode notices those assignments,
+so values cached on a node, and every cached value computed from it further up
+the trail, can be dropped, and so edit listeners can keep their own state up to date.
+"""
+from __future__ import annotations
+
+import weakref
+from typing import Any, Callable, Iterable
+
+EditListener = Callable[["TrackedNode", str, Any, Any], None]
+
+# Weak references to the listeners called after every edit.
+_listeners: list[weakref.ref] = []
+
+def add_edit_listener(listener: EditListener) -> None:
+    """
+    Calls listener(node, field, old, new) after every edit to a tracked field of any node.
+    Only a weak reference to the listener is kept, so it is dropped along with its owner.
+
+    :complexity: O(1)
+    """
+    ref = weakref.WeakMethod(listener) if hasattr(listener, "__self__") else weakref.ref(listener)
+    _listeners.append(ref)
+
+def remove_edit_listener(listener: EditListener) -> None:
+    """
+    Stops calling listener.
+
+    :complexity: O(l), where l is the number of listeners
+    """
+    _listeners[:] = [ref for ref in _listeners if ref() is not None and ref() != listener]
+
+# Cached values are kept as attributes of their node under this prefix.
+_CACHE_PREFIX = "_cached_"
+
+# Sets a field of a node being built, without going through TrackedNode.__setattr__.
+init_field = object.__setattr__
+
+class TrackedNode:
+    """
+    Base class for nodes whose cached values depend on their TRACKED_FIELDS.
+
+    A node caching a value computed from other nodes registers itself as a dependent
+    of them, so editing any of them also invalidates it.
+    Caches are never copied or pickled along with the node.
+
+    Subclasses set their fields in __init__ with init_field, which skips __setattr__,
+    so building a node costs little more than building a plain object.
+    """
+
+    TRACKED_FIELDS = ()
+
+    # Weak references to the nodes whose cached values depend on this one, if any.
+    __slots__ = ("_dependents",)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        if name not in self.TRACKED_FIELDS or name not in self.__dict__:
+            # Not tracked, or being set by __init__.
+            object.__setattr__(self, name, value)
+            return
+        old = self.__dict__[name]
+        object.__setattr__(self, name, value)
+        self.invalidate()
+        for ref in list(_listeners):
+            listener = ref()
+            if listener is None:
+                _listeners.remove(ref)
+            else:
+                listener(self, name, old, value)
+
+    def __getstate__(self) -> dict:
+        return {name: value for name, value in self.__dict__.items() if not name.startswith(_CACHE_PREFIX)}
+
+    def get_cached(self, key: str, default: Any = None) -> Any:
+        """
+        Returns the value cached under key, or default.
+
+        :complexity: O(1)
+        """
+        return getattr(self, _CACHE_PREFIX + key, default)
+
+    def set_cached(self, key: str, value: Any, sources: Iterable[TrackedNode] = ()) -> None:
+        """
+        Caches value under key until this node or one of the sources it was computed from is edited.
+
+        :complexity: O(len(sources)) amortised
+        """
+        init_field(self, _CACHE_PREFIX + key, value)
+        # weakref.ref hands back the same reference each time, so it can be compared by identity.
+        ref = weakref.ref(self)
+        for source in sources:
+            # A single dependent, the usual case, is kept as a bare weak reference.
+            dependents = getattr(source, "_dependents", None)
+            if dependents is None:
+                init_field(source, "_dependents", ref)
+            elif dependents.__class__ is not _Dependents:
+                if dependents is not ref:
+                    init_field(source, "_dependents", _Dependents(dependents, ref))
+            elif dependents[-1] is not ref:
+                dependents.add(ref)
+
+    def invalidate(self) -> None:
+        """
+        Drops the values cached on this node and on every node that depends on it.
+
+        :complexity: O(d), where d is the number of dependent nodes with cached values
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            state = node.__dict__
+            for name in [name for name in state if name.startswith(_CACHE_PREFIX)]:
+                del state[name]
+            dependents = getattr(node, "_dependents", None)
+            if dependents is None:
+                continue
+            del node._dependents
+            if dependents.__class__ is not _Dependents:
+                dependents = (dependents,)
+            for ref in dependents:
+                dependent = ref()
+                if dependent is not None:
+                    stack.append(dependent)
+
+class _Dependents(list):
+    """
+    Weak references to the nodes whose cached values depend on a node.
+
+    Recomputing a cached value may register the same dependent again, and dependents may be
+    collected, so the list drops dead and repeated references whenever it doubles in size.
+    """
+
+    __slots__ = ("limit",)
+
+    def __init__(self, *refs: weakref.ref) -> None:
+        super().__init__(refs)
+        self.limit = 8
+
+    def add(self, ref: weakref.ref) -> None:
+        """
+        :complexity: O(1) amortised
+        """
+        self.append(ref)
+        if len(self) > self.limit:
+            seen = set()
+            live = []
+            for ref in self:
+                dependent = ref()
+                if dependent is not None and id(dependent) not in seen:
+                    seen.add(id(dependent))
+                    live.append(ref)
+            self[:] = live
+            self.limit = max(8, 2 * len(live))
@@ -1,9 +1,15 @@
 from __future__ import annotations
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from hashlib import blake2b
+from bisect import bisect_right
+from itertools import accumulate, zip_longest
+import random
 
 from mountain import Mountain
+from tracked import TrackedNode, init_field
 
-from typing import TYPE_CHECKING, Union
+from typing import TYPE_CHECKING, Iterator, Union
 
 from data_structures import stack_adt
 
@@ -15,8 +21,30 @@ from data_structures import linked_stack
 if TYPE_CHECKING:
     from personality import WalkerPersonality
 
-@dataclass
-class TrailSplit:
+class _TrailNode(TrackedNode):
+    """
+    Structural hashing shared by Trail, TrailSeries and TrailSplit.
+
+    Each node caches a Merkle digest built from its mountain and the digests of its children,
+    so comparing subtrees whose digests are already cached is O(1).
+    Editing a node (or one of its mountains) drops the digests on the path back to the root.
+    """
+
+    def structural_hash(self) -> int:
+        """
+        Returns a 128-bit hash of the structure and mountains of this subtree.
+
+        :complexity: O(1) if cached, otherwise O(n) for the n uncached nodes below this one
+        """
+        return int.from_bytes(_structural_digest(self), "big")
+
+    def __eq__(self, other: object) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return self is other or _structural_digest(self) == _structural_digest(other)
+
+@dataclass(eq=False, init=False)
+class TrailSplit(_TrailNode):
     """
     A split in the trail.
        ___path_top____
@@ -25,16 +53,23 @@ class TrailSplit:
       \__path_bottom__/
     """
 
+    TRACKED_FIELDS = ("path_top", "path_bottom", "path_follow")
+
     path_top: Trail
     path_bottom: Trail
     path_follow: Trail
 
+    def __init__(self, path_top: Trail, path_bottom: Trail, path_follow: Trail) -> None:
+        init_field(self, "path_top", path_top)
+        init_field(self, "path_bottom", path_bottom)
+        init_field(self, "path_follow", path_follow)
+
     def remove_branch(self) -> TrailStore:
         """Removes the branch, should just leave the remaining following trail."""
         return self.path_follow.store
 
-@dataclass
-class TrailSeries:
+@dataclass(eq=False, init=False)
+class TrailSeries(_TrailNode):
     """
     A mountain, followed by the rest of the trail
 
@@ -42,9 +77,15 @@ class TrailSeries:
 
     """
 
+    TRACKED_FIELDS = ("mountain", "following")
+
     mountain: Mountain
     following: Trail
 
+    def __init__(self, mountain: Mountain, following: Trail) -> None:
+        init_field(self, "mountain", mountain)
+        init_field(self, "following", following)
+
     def remove_mountain(self) -> TrailStore:
         """
         Removes the mountain at the beginning of this series.
@@ -97,11 +138,16 @@ class TrailSeries:
     
 TrailStore = Union[TrailSplit, TrailSeries, None]
 
-@dataclass
-class Trail:
+@dataclass(eq=False, init=False)
+class Trail(_TrailNode):
+
+    TRACKED_FIELDS = ("store",)
 
     store: TrailStore = None
 
+    def __init__(self, store: TrailStore = None) -> None:
+        init_field(self, "store", store)
+
     def add_mountain_before(self, mountain: Mountain) -> Trail:
         """
         Adds a mountain before everything currently in the trail.
@@ -124,100 +170,650 @@ class Trail:
         """
         return Trail(TrailSplit(Trail(None), Trail(None), self))
 
-    def follow_path(self, personality: WalkerPersonality) -> None:
+    def iter_path(self, personality: WalkerPersonality, choices: list[bool]|None = None) -> Iterator[Mountain]:
         """
-        Follow a path and add mountains according to a personality.
-        
-        input: personality
-        output: none
+        Lazily yields the mountains on the path a personality takes, asking it to choose a branch
+        only when the walk reaches a split. Stopping early skips the rest of the walk.
+        The mountains are not added to the personality.
 
-        :complexity: O(n), where n is the number of mountains in the trail
+        All walk state is local to the generator, so any number of threads may walk the same
+        trail at once, as long as nobody edits it meanwhile (see walk_many).
+
+        input: personality, choices (if given, the branch taken at each split is appended to it, True for top)
+        output: the mountains on the path, in order
+
+        :complexity: O(1) per mountain, plus O(1) per split passed on the way to it
 
         """
-        
-        self.s1 = linked_stack.LinkedStack(999)
+        pending = linked_stack.LinkedStack()
 
         store = self.store
         while True:
 
-            
             if store is None: #if trail is empty 
-                if self.s1.is_empty() is True: #if stack is empty
-                    break
-                else:
-
-                    store = self.s1.pop() #set the current store to the following store
+                if pending.is_empty(): #if stack is empty
+                    return
+                store = pending.pop() #set the current store to the following store
 
             elif isinstance(store, TrailSeries): #if trail is a series
 
-                    personality.add_mountain(store.mountain) #add mountain to the personality
-                    store = store.following.store
+                yield store.mountain
+                store = store.following.store
 
             elif isinstance(store, TrailSplit): #if trail is a split
                 
-                self.s1.push(store.path_follow.store) #push the following path to the stack
+                pending.push(store.path_follow.store) #push the following path to the stack
 
-                if personality.select_branch(store.path_top, store.path_bottom) is True: #if personality selects top branch (True)
-                    
+                top = personality.select_branch(store.path_top, store.path_bottom) is True #if personality selects top branch (True)
+                if choices is not None:
+                    choices.append(top)
+                if top:
                     store = store.path_top.store #top branch
                 else:
-                    store= store.path_bottom.store #bottom branch
+                    store = store.path_bottom.store #bottom branch
             else:
                 raise ValueError("Invalid TrailStore")
 
-    def collect_all_mountains(self) -> list[Mountain]:
+    def follow_path(self, personality: WalkerPersonality, trace: bool = False) -> WalkTrace|None:
         """
-        Returns a list of all mountains on the trail.
+        Follow a path and add mountains according to a personality (see iter_path).
+        
+        input: personality, trace (whether to record the branches taken)
+        output: a WalkTrace of the walk if trace is True, which replay turns back into its mountains, else None
 
         :complexity: O(n), where n is the number of mountains in the trail
 
         """
-        def collect_mountains_from_trail_store(store) -> list[Mountain]:
+        if not trace:
+            for mountain in self.iter_path(personality):
+                personality.add_mountain(mountain) #add mountain to the personality
+            return None
+        choices = []
+        route = _route_hasher()
+        for mountain in self.iter_path(personality, choices):
+            personality.add_mountain(mountain)
+            route.update(_mountain_key(mountain))
+        return WalkTrace.pack(route.digest(), choices)
+
+    def walk_within_budget(self, personality: WalkerPersonality, max_length: int|None = None, max_difficulty: int|None = None) -> BudgetWalk:
+        """
+        Follow a path as follow_path does, stopping before the first mountain that would take
+        the total length past max_length or the total difficulty past max_difficulty.
+        The mountains walked are added to the personality.
+
+        Each run of series keeps cumulative length and difficulty sums (cached on its first series
+        until the run is edited), so the cutoff within a run is found by binary search.
+
+        input: personality, max_length, max_difficulty (None for no limit)
+        output: a BudgetWalk with the mountains walked and the budget left
+
+        :complexity: O(s + r*log(m)), where s is the number of splits and r the number of runs on the path,
+                     and m the length of the longest run, once the runs' sums are cached
+
+        """
+        length_left, difficulty_left = max_length, max_difficulty
+        walked = []
+        pending = linked_stack.LinkedStack()
+
+        store = self.store
+        while True:
             if store is None:
-                return []
+                if pending.is_empty():
+                    break
+                store = pending.pop()
             elif isinstance(store, TrailSeries):
-                return [store.mountain] + collect_mountains_from_trail_store(store.following.store)
+                mountains, lengths, difficulties, length_peaks, difficulty_peaks, end = _run_sums(store)
+                n = len(mountains)
+                if length_left is not None:
+                    n = min(n, bisect_right(length_peaks, length_left))
+                if difficulty_left is not None:
+                    n = min(n, bisect_right(difficulty_peaks, difficulty_left))
+                # Added before the next split, so the personality chooses knowing what it has walked.
+                for mountain in mountains[:n]:
+                    walked.append(mountain)
+                    personality.add_mountain(mountain)
+                if n:
+                    if length_left is not None:
+                        length_left -= lengths[n - 1]
+                    if difficulty_left is not None:
+                        difficulty_left -= difficulties[n - 1]
+                if n < len(mountains):
+                    break
+                store = end
             elif isinstance(store, TrailSplit):
-                return (collect_mountains_from_trail_store(store.path_top.store) + collect_mountains_from_trail_store(store.path_bottom.store) + collect_mountains_from_trail_store(store.path_follow.store))
+                pending.push(store.path_follow.store)
+                if personality.select_branch(store.path_top, store.path_bottom) is True:
+                    store = store.path_top.store
+                else:
+                    store = store.path_bottom.store
             else:
                 raise ValueError("Invalid TrailStore")
-        return collect_mountains_from_trail_store(self.store)
+
+        return BudgetWalk(walked, length_left, difficulty_left)
+
+    def follow_paths(self, personalities: list[WalkerPersonality]) -> None:
+        """
+        Follow a path for every personality in a single pass, adding the same mountains
+        and asking the same branch questions as follow_path would for each of them.
+
+        Walkers are grouped by the branches they pick, so each series on a route
+        is visited once for the whole group rather than once per walker.
+
+        input: personalities
+        output: none
+
+        :complexity: O(r*n + w*s), where r is the number of distinct routes taken, n the number
+                     of nodes on a route, w the number of walkers and s the number of splits on a route
+
+        """
+        from personality import WalkerPersonality
+
+        def add_mountains(walkers, mountains):
+            if not mountains:
+                return
+            for walker in walkers:
+                if type(walker).add_mountain is WalkerPersonality.add_mountain:
+                    walker.mountains.extend(mountains)
+                else:
+                    for mountain in mountains:
+                        walker.add_mountain(mountain)
+
+        # Each group is (store, pending follow paths as linked (store, rest) tuples, walkers).
+        groups = [(self.store, None, list(personalities))]
+        while groups:
+            store, pending, walkers = groups.pop()
+            mountains = []
+            while True:
+                if store is None:
+                    if pending is None:
+                        break
+                    store, pending = pending
+                elif isinstance(store, TrailSeries):
+                    mountains.append(store.mountain)
+                    store = store.following.store
+                elif isinstance(store, TrailSplit):
+                    add_mountains(walkers, mountains)
+                    mountains = []
+                    pending = (store.path_follow.store, pending)
+                    top, bottom = [], []
+                    for walker in walkers:
+                        if walker.select_branch(store.path_top, store.path_bottom) is True:
+                            top.append(walker)
+                        else:
+                            bottom.append(walker)
+                    if bottom:
+                        groups.append((store.path_bottom.store, pending, bottom))
+                    if not top:
+                        break
+                    store, walkers = store.path_top.store, top
+                else:
+                    raise ValueError("Invalid TrailStore")
+            add_mountains(walkers, mountains)
+
+    def iter_mountains(self) -> Iterator[Mountain]:
+        """
+        Yields every mountain on the trail, in the same order as collect_all_mountains
+        (top branch, then bottom branch, then the following trail).
+
+        Walks the trail with an explicit stack, so long series do not hit the recursion limit.
+
+        :complexity: O(n), where n is the number of mountains in the trail
+
+        """
+        pending = linked_stack.LinkedStack()
+
+        store = self.store
+        while True:
+            if store is None:
+                if pending.is_empty():
+                    return
+                store = pending.pop()
+            elif isinstance(store, TrailSeries):
+                yield store.mountain
+                store = store.following.store
+            elif isinstance(store, TrailSplit):
+                pending.push(store.path_follow.store) #bottom and follow are visited after the top branch
+                pending.push(store.path_bottom.store)
+                store = store.path_top.store
+            else:
+                raise ValueError("Invalid TrailStore")
+
+    def collect_all_mountains(self) -> list[Mountain]:
+        """
+        Returns a list of all mountains on the trail.
+
+        :complexity: O(n), where n is the number of mountains in the trail
+
+        """
+        return list(self.iter_mountains())
+
+    def iter_length_k_paths(self, k: int) -> Iterator[list[Mountain]]:
+        """
+        Lazily yields every path containing exactly k mountains, in the same order as length_k_paths.
+
+        Paths are unique if they take a different branch, even if this results in the same set of mountains.
+        A path runs from the start to the end of the trail, taking either the top or bottom branch at
+        every split before continuing along the following path.
+
+        input: k (number of mountains in the path)
+        output: each path, as a new list of mountains
+
+        :complexity: O(n*k), where n is the number of paths explored
+
+        """
+        path = []
+        # Each frame is (store, mountains on the path so far, pending follow paths).
+        # Pending follow paths are a linked list of (store, rest) tuples shared between frames.
+        frames = [(self.store, 0, None)]
+        while frames:
+            store, depth, pending = frames.pop()
+            del path[depth:]
+            while True:
+                if store is None:
+                    if pending is None:
+                        if depth == k:
+                            yield path.copy()
+                        break
+                    store, pending = pending
+                elif isinstance(store, TrailSeries):
+                    if depth == k: #path is already too long
+                        break
+                    path.append(store.mountain)
+                    depth += 1
+                    store = store.following.store
+                elif isinstance(store, TrailSplit):
+                    pending = (store.path_follow.store, pending)
+                    frames.append((store.path_bottom.store, depth, pending))
+                    store = store.path_top.store
+                else:
+                    raise ValueError("Invalid TrailStore")
 
     def length_k_paths(self, k) -> list[list[Mountain]]: # Input to this should not exceed k > 50, at most 5 branches.
         """
         Returns a list of all paths of containing exactly k mountains.
-        Paths are represented as lists of mountains.
+        Paths are represented as lists of mountains, see iter_length_k_paths.
 
-        Paths are unique if they take a different branch, even if this results in the same set of mountains.
-        
         input: k (number of mountains in the path)
         output: list of all paths of containing exactly k mountains
 
-        :complexity: O(n)
+        :complexity: O(n*k), where n is the number of paths explored
 
         """
-        def _length_k_paths(store, path=None):
-            if path is None :
-                path = []
-            
-            if isinstance(store, TrailSeries):
-                path.append(store.mountain.name)
-                if len(path) == k:
-                    paths.append(path.copy())
-                elif len(path) < k:
-                    _length_k_paths(store.following.store, path)
-                path.pop()
-                
-            elif isinstance(store, TrailSplit):
-                _length_k_paths(store.path_top.store, path.copy())
-                _length_k_paths(store.path_bottom.store, path.copy())
-                _length_k_paths(store.path_follow.store, path.copy())
-                
-            elif store is None: 
-                return
+        return list(self.iter_length_k_paths(k))
+
+    def count_length_k_paths(self, k: int) -> int:
+        """
+        Returns the number of paths containing exactly k mountains, without building them.
+
+        :complexity: O(s*k^2 + n), where s is the number of splits and n the number of mountains
+
+        """
+        if k < 0:
+            return 0
+        counts = self._path_length_distribution(k)
+        return counts[k] if k < len(counts) else 0
+
+    def path_length_histogram(self) -> list[int]:
+        """
+        Returns a list where index j holds the number of paths containing exactly j mountains.
+
+        :complexity: O(s*L^2 + n), where s is the number of splits, L the longest path
+                     and n the number of mountains
+
+        """
+        return self._path_length_distribution()
+
+    def sample_paths(self, n: int, k: int|None = None, seed=None) -> list[list[Mountain]]:
+        """
+        Draws n paths uniformly at random (with replacement) from every path on the trail,
+        or only from the paths containing exactly k mountains.
+        Paths follow the same rules as length_k_paths.
+
+        input: n (number of paths), k (optional path length), seed (for random.Random)
+        output: list of n paths, each a list of mountains
+
+        :raises ValueError: if there are no paths of length k
+
+        :complexity: O(s*k^2 + n) to count paths, then O(p) per path of p mountains
+                     (O(p*k) when k is given)
+
+        """
+        rng = random.Random(seed)
+        count, end = _series_run(self.store)
+        branches = {}
+        if k is None:
+            _split_path_counts(end, branches)
+        else:
+            if k < count:
+                raise ValueError(f"No paths of length {k}")
+            dists = _split_distributions(end, k - count, branches)
+            total = dists.get(id(end), [1])
+            if k - count >= len(total) or total[k - count] == 0:
+                raise ValueError(f"No paths of length {k}")
+
+        def sample_one() -> list[Mountain]:
+            path = []
+            todo = [(self.store, k)]   #(store, mountains the store must add, or None for any)
+            while todo:
+                store, target = todo.pop()
+                while isinstance(store, TrailSeries):
+                    path.append(store.mountain)
+                    store = store.following.store
+                    if target is not None:
+                        target -= 1
+                if store is None:
+                    continue
+                top, bottom, follow = branches[id(store)]
+                if target is None:
+                    take_top = rng.randrange(top + bottom) < top
+                    todo.append((store.path_follow.store, None))
+                    todo.append(((store.path_top if take_top else store.path_bottom).store, None))
+                    continue
+                # Pick the branch and how many of the target mountains it adds,
+                # weighted by how many paths complete each choice.
+                choice = rng.randrange(dists[id(store)][target])
+                for branch, counts in ((store.path_top, top), (store.path_bottom, bottom)):
+                    for j in range(max(0, target - len(follow) + 1), min(len(counts), target + 1)):
+                        choice -= counts[j] * follow[target - j]
+                        if choice < 0:
+                            break
+                    if choice < 0:
+                        break
+                todo.append((store.path_follow.store, target - j))
+                todo.append((branch.store, j))
+            return path
+
+        return [sample_one() for _ in range(n)]
+
+    def _path_length_distribution(self, limit: int|None = None) -> list[int]:
+        """
+        Path counts by length for the whole trail, ignoring paths longer than limit.
+
+        :complexity: O(s*L^2 + n), where L is the longest path considered
+        """
+        count, end = _series_run(self.store)
+        return _shift(_split_distributions(end, limit).get(id(end), [1]), count, limit)
+
+
+def walk_many(trail: Trail, personalities: list[WalkerPersonality], workers: int|None = None) -> list[WalkerPersonality]:
+    """
+    Walks the trail once for each personality on a pool of worker threads.
+    The trail must not be edited while the walks run.
+
+    input: trail, personalities, workers (number of threads, defaults to ThreadPoolExecutor's choice)
+    output: the personalities, in the same order, each having followed its path
+
+    :complexity: O(w*n), where w is the number of personalities and n the number of mountains in the trail
+
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # Consume the results so exceptions from the walks are raised here.
+        list(pool.map(trail.follow_path, personalities))
+    return personalities
+
+@dataclass
+class BudgetWalk:
+    """
+    Result of Trail.walk_within_budget: the mountains walked, and the length and difficulty
+    budgets left after them (None where there was no limit).
+    """
+
+    mountains: list[Mountain]
+    length_left: int|None
+    difficulty_left: int|None
+
+@dataclass(frozen=True)
+class WalkTrace:
+    """
+    Compact record of a walk: the branch taken at each split met (bit i of the packed bits,
+    least significant bit first, 1 for top) and a digest of the mountains walked, built up
+    during the walk, so recording a trace costs O(1) per mountain on top of the walk itself.
+    bytes(trace) is the stored form, 16 + 4 + ceil(splits/8) bytes.
+    """
+
+    fingerprint: bytes
+    splits: int
+    bits: bytes
+
+    @classmethod
+    def pack(cls, fingerprint: bytes, choices: list[bool]) -> WalkTrace:
+        """
+        Packs the branches taken at each split, True for top.
+
+        :complexity: O(s), where s is the number of splits
+        """
+        bits = bytearray((len(choices) + 7) // 8)
+        for i, top in enumerate(choices):
+            if top:
+                bits[i >> 3] |= 1 << (i & 7)
+        return cls(fingerprint, len(choices), bytes(bits))
+
+    def __bytes__(self) -> bytes:
+        return self.fingerprint + self.splits.to_bytes(4, "big") + self.bits
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> WalkTrace:
+        """
+        Reads a trace written by bytes(trace).
+
+        :raises ValueError: if data is not a trace
+
+        :complexity: O(s), where s is the size of data
+        """
+        splits = int.from_bytes(data[16:20], "big")
+        if len(data) != 20 + (splits + 7) // 8:
+            raise ValueError("Invalid WalkTrace")
+        return cls(bytes(data[:16]), splits, bytes(data[20:]))
+
+def replay(trail: Trail, trace: WalkTrace) -> list[Mountain]:
+    """
+    Returns the mountains of a traced walk, taking the recorded branches without
+    consulting any personality.
+
+    Only the route is checked against the trace, so edits elsewhere in the trail do not stop
+    a replay.
+
+    :raises ValueError: if the trace does not match the trail's splits, or the route now has
+                        different mountains from the ones walked when it was traced
+
+    :complexity: O(n), where n is the number of nodes on the walk
+
+    """
+    bits, splits = trace.bits, trace.splits
+    res = []
+    pending = []
+    split = 0
+
+    store = trail.store
+    while True:
+        if store is None:
+            if not pending:
+                break
+            store = pending.pop()
+        elif isinstance(store, TrailSeries):
+            res.append(store.mountain)
+            store = store.following.store
+        elif isinstance(store, TrailSplit):
+            if split == splits:
+                raise ValueError("Trace is shorter than the walk")
+            pending.append(store.path_follow.store)
+            if bits[split >> 3] >> (split & 7) & 1:
+                store = store.path_top.store
+            else:
+                store = store.path_bottom.store
+            split += 1
+        else:
+            raise ValueError("Invalid TrailStore")
+
+    if split != splits:
+        raise ValueError("Trace is longer than the walk")
+    route = _route_hasher()
+    for mountain in res:
+        route.update(_mountain_key(mountain))
+    if route.digest() != trace.fingerprint:
+        raise ValueError("Trace was recorded on a different trail")
+    return res
+
+def _route_hasher() -> blake2b:
+    """Hash of the mountains on a walk, in order, fed one _mountain_key at a time."""
+    return blake2b(b"R", digest_size=16)
+
+def _mountain_key(m: Mountain) -> bytes:
+    """The values of a mountain that structural and route digests cover."""
+    return repr((m.name, m.difficulty_level, m.length)).encode()
+
+def _structural_digest(node: Trail|TrailSeries|TrailSplit) -> bytes:
+    """
+    Merkle digest of a node, computed after (and cached along with) the digests of its children.
+
+    :complexity: O(1) if cached, otherwise O(n) for the n uncached nodes below node
+    """
+    digest = node.get_cached("digest")
+    if digest is not None:
+        return digest
+    # Each node is pushed once to visit its children, then again (with its children) to be hashed.
+    stack = [(node, None)]
+    while stack:
+        cur, children = stack.pop()
+        if children is None:
+            if cur.get_cached("digest") is not None:
+                continue
+            if isinstance(cur, Trail):
+                children = () if cur.store is None else (cur.store,)
+            elif isinstance(cur, TrailSeries):
+                children = (cur.following,)
+            elif isinstance(cur, TrailSplit):
+                children = (cur.path_top, cur.path_bottom, cur.path_follow)
             else:
                 raise ValueError("Invalid TrailStore")
-            
-        paths = []
-        _length_k_paths(self.store)
-        return [','.join(path) for path in paths]
\ No newline at end of file
+            stack.append((cur, children))
+            stack.extend((child, None) for child in children)
+            continue
+        if isinstance(cur, TrailSeries):
+            m = cur.mountain
+            h = blake2b(b"S", digest_size=16)
+            h.update(_mountain_key(m))
+            sources = children + (m,)
+        else:
+            h = blake2b(b"T" if isinstance(cur, Trail) else b"P", digest_size=16)
+            sources = children
+        for child in children:
+            h.update(child.get_cached("digest"))
+        cur.set_cached("digest", h.digest(), sources)
+    return node.get_cached("digest")
+
+def _series_run(store: TrailStore) -> tuple[int, TrailStore]:
+    """Skips the run of series at the start of store, returning its length and the store after it."""
+    count = 0
+    while isinstance(store, TrailSeries):
+        count += 1
+        store = store.following.store
+    return count, store
+
+def _run_sums(store: TrailSeries) -> tuple[list[Mountain], list[int], list[int], list[int], list[int], TrailStore]:
+    """
+    Returns the mountains in the run of series starting at store, the cumulative sums of their
+    lengths and difficulties, the running maxima of those sums, and the store after the run.
+    Cached on store until the run is edited.
+
+    The running maxima are sorted even when some values are negative, so bisecting them
+    finds the first mountain whose cumulative sum goes over a budget.
+    """
+    sums = store.get_cached("run_sums")
+    if sums is not None:
+        return sums
+    mountains, sources = [], []
+    cur = store
+    while isinstance(cur, TrailSeries):
+        mountains.append(cur.mountain)
+        sources += [cur, cur.mountain, cur.following]
+        cur = cur.following.store
+    lengths = list(accumulate(m.length for m in mountains))
+    difficulties = list(accumulate(m.difficulty_level for m in mountains))
+    sums = (mountains, lengths, difficulties, _peaks(lengths), _peaks(difficulties), cur)
+    store.set_cached("run_sums", sums, sources)
+    return sums
+
+def _peaks(sums: list[int]) -> list[int]:
+    """Running maxima of sums (sums itself when it never decreases)."""
+    if all(a <= b for a, b in zip(sums, sums[1:])):
+        return sums
+    return list(accumulate(sums, max))
+
+def _shift(counts: list[int], by: int, limit: int|None) -> list[int]:
+    """Path counts after prepending by mountains to every path."""
+    if limit is not None:
+        if by > limit:
+            return []
+        return ([0] * by + counts)[:limit + 1]
+    return [0] * by + counts
+
+def _convolve(a: list[int], b: list[int], limit: int|None) -> list[int]:
+    """Path counts for a path from a followed by a path from b."""
+    if not a or not b:
+        return []
+    size = len(a) + len(b) - 1
+    if limit is not None:
+        size = min(size, limit + 1)
+    res = [0] * size
+    for i, x in enumerate(a[:size]):
+        if x:
+            for j, y in enumerate(b[:size - i]):
+                res[i + j] += x * y
+    return res
+
+def _splits_post_order(store: TrailStore) -> Iterator[TrailSplit]:
+    """Yields every split reachable from store once, after all of the splits inside it."""
+    done = set()
+    stack = [store]
+    while stack:
+        split = stack[-1]
+        if not isinstance(split, TrailSplit) or id(split) in done:
+            stack.pop()
+            continue
+        ends = (_series_run(path.store)[1] for path in (split.path_top, split.path_bottom, split.path_follow))
+        missing = [end for end in ends if isinstance(end, TrailSplit) and id(end) not in done]
+        if missing:
+            stack.extend(missing)
+            continue
+        done.add(id(split))
+        stack.pop()
+        yield split
+
+def _split_distributions(store: TrailStore, limit: int|None, branches: dict|None = None) -> dict[int, list[int]]:
+    """
+    Path counts by length for every split reachable from store, keyed by id of the split.
+    Each split combines its branches by adding the top and bottom counts,
+    then convolving with the counts of the following path.
+    If branches is given, the (top, bottom, follow) counts of each split are stored in it too.
+
+    :complexity: O(s*L^2 + n), where s is the number of splits, L the longest path considered
+                 and n the number of mountains
+    """
+    dists = {}
+    for split in _splits_post_order(store):
+        runs = (_series_run(path.store) for path in (split.path_top, split.path_bottom, split.path_follow))
+        top, bottom, follow = (_shift(dists.get(id(end), [1]), count, limit) for count, end in runs)
+        branch = [x + y for x, y in zip_longest(top, bottom, fillvalue=0)]
+        dists[id(split)] = _convolve(branch, follow, limit)
+        if branches is not None:
+            branches[id(split)] = (top, bottom, follow)
+    return dists
+
+def _split_path_counts(store: TrailStore, branches: dict) -> None:
+    """
+    Stores the total number of paths through the (top, bottom, follow) trails
+    of every split reachable from store, keyed by id of the split.
+
+    :complexity: O(s + n), where s is the number of splits and n the number of mountains
+    """
+    for split in _splits_post_order(store):
+        counts = []
+        for path in (split.path_top, split.path_bottom, split.path_follow):
+            end = _series_run(path.store)[1]
+            if isinstance(end, TrailSplit):
+                top, bottom, follow = branches[id(end)]
+                counts.append((top + bottom) * follow)
+            else:
+                counts.append(1)
+        branches[id(split)] = tuple(counts)
@@ -0,0 +1,119 @@
+"""
+Per-subtree summaries of a trail, cached on its nodes.
+
+Values are computed in one post-order pass and cached on every TrailSeries/TrailSplit.
+Editing a node drops the cached values on the path back to the root (see tracked.py),
+so the next read only recomputes that path; reading a cached value is O(1).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Callable, TypeVar
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+
+V = TypeVar('V')
+
+_MISSING = object()
+
+def cached_fold(
+    node: Trail|TrailStore,
+    key: str,
+    empty: V,
+    series: Callable[[Mountain, V], V],
+    split: Callable[[V, V, V], V],
+) -> V:
+    """
+    Folds a trail bottom-up, caching the value of every series and split under key.
+
+    empty: value of an empty trail
+    series(mountain, following): value of a series, given the value of its following trail
+    split(top, bottom, follow): value of a split, given the values of its three trails
+
+    :complexity: O(1) if cached, otherwise O(n) for the n uncached nodes below node
+    """
+    store = node.store if isinstance(node, Trail) else node
+    if store is None:
+        return empty
+    stack = [store]
+    while stack:
+        cur = stack[-1]
+        if cur.get_cached(key, _MISSING) is not _MISSING:
+            stack.pop()
+            continue
+        if isinstance(cur, TrailSeries):
+            children = [cur.following]
+        elif isinstance(cur, TrailSplit):
+            children = [cur.path_top, cur.path_bottom, cur.path_follow]
+        else:
+            raise ValueError("Invalid TrailStore")
+        stores = [child.store for child in children if child.store is not None]
+        missing = [child for child in stores if child.get_cached(key, _MISSING) is _MISSING]
+        if missing:
+            stack.extend(missing)
+            continue
+        stack.pop()
+        values = [empty if child.store is None else child.store.get_cached(key) for child in children]
+        # Depend on the child trails too, so replacing their store is noticed.
+        sources = children + stores
+        if isinstance(cur, TrailSeries):
+            cur.set_cached(key, series(cur.mountain, *values), sources + [cur.mountain])
+        else:
+            cur.set_cached(key, split(*values), sources)
+    return store.get_cached(key)
+
+@dataclass(frozen=True, slots=True)
+class TrailAggregate:
+    """
+    Summary of every mountain in a subtree, across all of its branches.
+
+    min_difficulty and max_difficulty are None when there are no mountains.
+    max_depth is the deepest nesting of splits, 0 when there are none.
+    """
+
+    min_difficulty: int|None
+    max_difficulty: int|None
+    total_length: int
+    mountain_count: int
+    max_depth: int
+    split_count: int
+
+EMPTY_AGGREGATE = TrailAggregate(None, None, 0, 0, 0, 0)
+
+def _min(*values: int|None) -> int|None:
+    present = [value for value in values if value is not None]
+    return min(present) if present else None
+
+def _max(*values: int|None) -> int|None:
+    present = [value for value in values if value is not None]
+    return max(present) if present else None
+
+def _series_aggregate(mountain: Mountain, following: TrailAggregate) -> TrailAggregate:
+    return TrailAggregate(
+        _min(mountain.difficulty_level, following.min_difficulty),
+        _max(mountain.difficulty_level, following.max_difficulty),
+        mountain.length + following.total_length,
+        1 + following.mountain_count,
+        following.max_depth,
+        following.split_count,
+    )
+
+def _split_aggregate(top: TrailAggregate, bottom: TrailAggregate, follow: TrailAggregate) -> TrailAggregate:
+    parts = (top, bottom, follow)
+    return TrailAggregate(
+        _min(*(part.min_difficulty for part in parts)),
+        _max(*(part.max_difficulty for part in parts)),
+        sum(part.total_length for part in parts),
+        sum(part.mountain_count for part in parts),
+        max(1 + top.max_depth, 1 + bottom.max_depth, follow.max_depth),
+        1 + sum(part.split_count for part in parts),
+    )
+
+def aggregate(node: Trail|TrailStore) -> TrailAggregate:
+    """
+    Returns the summary of a trail or of the subtree starting at a series or split.
+
+    :complexity: O(1) if cached, otherwise O(n) for the n uncached nodes below node
+    """
+    return cached_fold(node, "aggregate", EMPTY_AGGREGATE, _series_aggregate, _split_aggregate)
@@ -0,0 +1,104 @@
+"""
+Hash-consing for trails.
+
+Trail files repeat the same sub-trails many times over. Building them through a
+TrailFactory makes every structurally identical subtree one shared object, which
+saves memory and makes comparing them an identity check.
+"""
+from __future__ import annotations
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+
+class TrailFactory:
+    """
+    Builds trail nodes, handing back an existing node whenever an identical one was built before.
+
+    Children are always consed before their parents, so two nodes are identical exactly when
+    their own values match and their children are the same objects.
+
+    Consed nodes are shared by every trail that uses them, so they should only be edited with the
+    edit methods (which build new nodes), never by assigning to their fields.
+    """
+
+    def __init__(self) -> None:
+        """
+        :complexity: O(1)
+        """
+        self.nodes = {}
+
+    def __len__(self) -> int:
+        """Number of distinct nodes built so far."""
+        return len(self.nodes)
+
+    def _cons(self, key: tuple, build) -> object:
+        node = self.nodes.get(key)
+        if node is None:
+            node = self.nodes[key] = build()
+        return node
+
+    def mountain(self, name: str, difficulty_level: int, length: int) -> Mountain:
+        """
+        :complexity: O(1)
+        """
+        return self._cons(("M", name, difficulty_level, length), lambda: Mountain(name, difficulty_level, length))
+
+    def trail(self, store: TrailStore = None) -> Trail:
+        """
+        :complexity: O(1)
+        """
+        return self._cons(("T", id(store)), lambda: Trail(store))
+
+    def series(self, mountain: Mountain, following: Trail) -> TrailSeries:
+        """
+        :complexity: O(1)
+        """
+        return self._cons(("S", id(mountain), id(following)), lambda: TrailSeries(mountain, following))
+
+    def split(self, path_top: Trail, path_bottom: Trail, path_follow: Trail) -> TrailSplit:
+        """
+        :complexity: O(1)
+        """
+        return self._cons(
+            ("P", id(path_top), id(path_bottom), id(path_follow)),
+            lambda: TrailSplit(path_top, path_bottom, path_follow)
+        )
+
+    def intern(self, trail: Trail) -> Trail:
+        """
+        Returns the consed copy of an existing trail, leaving the original untouched.
+
+        :complexity: O(n), where n is the number of nodes in the trail
+        """
+        consed = {}
+        stack = [trail]
+        while stack:
+            node = stack[-1]
+            if id(node) in consed:
+                stack.pop()
+                continue
+            if isinstance(node, Trail):
+                children = [] if node.store is None else [node.store]
+            elif isinstance(node, TrailSeries):
+                children = [node.mountain, node.following]
+            elif isinstance(node, TrailSplit):
+                children = [node.path_top, node.path_bottom, node.path_follow]
+            elif isinstance(node, Mountain):
+                children = []
+            else:
+                raise ValueError("Invalid TrailStore")
+            missing = [child for child in children if id(child) not in consed]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            args = [consed[id(child)] for child in children]
+            if isinstance(node, Trail):
+                consed[id(node)] = self.trail(*args)
+            elif isinstance(node, TrailSeries):
+                consed[id(node)] = self.series(*args)
+            elif isinstance(node, TrailSplit):
+                consed[id(node)] = self.split(*args)
+            else:
+                consed[id(node)] = self.mountain(node.name, node.difficulty_level, node.length)
+        return consed[id(trail)]
@@ -0,0 +1,177 @@
+"""
+Versioned trail history with undo/redo.
+"""
+from __future__ import annotations
+
+from dataclasses import replace
+from typing import Callable, Sequence
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+
+TrailPath = Sequence[str]
+
+class TrailHistory:
+    """
+    Keeps every version of a trail, one per edit.
+
+    Each edit builds a new version by path copying: the nodes from the root down to the
+    edited trail are copied, everything else is shared with the previous version.
+    Versions share nodes, so they must not be edited in place.
+
+    Edits are addressed by a path, the field names leading from the root Trail to the trail
+    being edited. For example ("following", "path_top") is the top branch of the split that
+    comes after the first mountain, and () is the root itself.
+    """
+
+    def __init__(self, trail: Trail) -> None:
+        """
+        :complexity: O(1)
+        """
+        self.versions = [trail]
+        self.position = 0
+
+    def __len__(self) -> int:
+        """Number of versions, including the original trail."""
+        return len(self.versions)
+
+    @property
+    def current(self) -> Trail:
+        """The version currently checked out."""
+        return self.versions[self.position]
+
+    def version(self, n: int) -> Trail:
+        """
+        Returns version n, where version 0 is the original trail.
+
+        :complexity: O(1)
+        """
+        return self.versions[n]
+
+    def checkout(self, n: int) -> Trail:
+        """
+        Makes version n current. Editing from there discards the versions after it.
+
+        :raises IndexError: if there is no version n
+
+        :complexity: O(1)
+        """
+        if not 0 <= n < len(self.versions):
+            raise IndexError("No such version")
+        self.position = n
+        return self.current
+
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    def can_redo(self) -> bool:
+        return self.position < len(self.versions) - 1
+
+    def undo(self) -> Trail:
+        """
+        Steps back to the previous version.
+
+        :raises IndexError: if there is nothing to undo
+
+        :complexity: O(1)
+        """
+        return self.checkout(self.position - 1)
+
+    def redo(self) -> Trail:
+        """
+        Steps forward to the version that was undone.
+
+        :raises IndexError: if there is nothing to redo
+
+        :complexity: O(1)
+        """
+        return self.checkout(self.position + 1)
+
+    def add_mountain_before(self, path: TrailPath, mountain: Mountain) -> Trail:
+        """
+        Adds a mountain before everything in the trail at path.
+
+        :complexity: O(d), where d is the length of path
+        """
+        return self._edit(path, lambda trail: trail.add_mountain_before(mountain).store)
+
+    def add_empty_branch_before(self, path: TrailPath) -> Trail:
+        """
+        Adds an empty branch before everything in the trail at path.
+
+        :complexity: O(d), where d is the length of path
+        """
+        return self._edit(path, lambda trail: trail.add_empty_branch_before().store)
+
+    def add_mountain_after(self, path: TrailPath, mountain: Mountain) -> Trail:
+        """
+        Adds a mountain after the first mountain of the trail at path.
+
+        :complexity: O(d), where d is the length of path
+        """
+        return self._edit(path, lambda trail: self._series(trail).add_mountain_after(mountain))
+
+    def add_empty_branch_after(self, path: TrailPath) -> Trail:
+        """
+        Adds an empty branch after the first mountain of the trail at path.
+
+        :complexity: O(d), where d is the length of path
+        """
+        return self._edit(path, lambda trail: self._series(trail).add_empty_branch_after())
+
+    def remove_mountain(self, path: TrailPath) -> Trail:
+        """
+        Removes the first mountain of the trail at path.
+
+        :complexity: O(d), where d is the length of path
+        """
+        return self._edit(path, lambda trail: self._series(trail).remove_mountain())
+
+    def remove_branch(self, path: TrailPath) -> Trail:
+        """
+        Removes the split at the start of the trail at path, keeping its following trail.
+
+        :complexity: O(d), where d is the length of path
+        """
+        def remove(trail: Trail) -> TrailStore:
+            if not isinstance(trail.store, TrailSplit):
+                raise ValueError("Trail does not start with a branch")
+            return trail.store.remove_branch()
+        return self._edit(path, remove)
+
+    def _series(self, trail: Trail) -> TrailSeries:
+        if not isinstance(trail.store, TrailSeries):
+            raise ValueError("Trail does not start with a mountain")
+        return trail.store
+
+    def _edit(self, path: TrailPath, edit: Callable[[Trail], TrailStore]) -> Trail:
+        """
+        Records a new version where the trail at path has its store replaced by edit(trail).
+
+        :raises ValueError: if path does not lead to a trail
+
+        :complexity: O(d), where d is the length of path
+        """
+        parents = []
+        trail = self.current
+        for attribute in path:
+            store = trail.store
+            if isinstance(store, TrailSeries):
+                children = ("following",)
+            elif isinstance(store, TrailSplit):
+                children = ("path_top", "path_bottom", "path_follow")
+            else:
+                children = ()
+            if attribute not in children:
+                raise ValueError(f"Invalid trail path {tuple(path)}")
+            parents.append((store, attribute))
+            trail = getattr(store, attribute)
+
+        new_trail = Trail(edit(trail))
+        for store, attribute in reversed(parents):
+            new_trail = Trail(replace(store, **{attribute: new_trail}))
+
+        del self.versions[self.position + 1:]
+        self.versions.append(new_trail)
+        self.position += 1
+        return new_trail
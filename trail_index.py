@@ -0,0 +1,199 @@
+"""
+Index of where each mountain sits in a trail, kept up to date as the trail is edited.
+"""
+from __future__ import annotations
+
+from typing import Union
+
+from mountain import Mountain
+from trail import Trail, TrailSeries, TrailSplit, TrailStore
+from tracked import add_edit_listener, remove_edit_listener
+
+Node = Union[Trail, TrailSeries, TrailSplit, Mountain]
+
+# Parent key used for the root trail.
+ROOT = 0
+
+def _children(node: Node) -> list[Node]:
+    if isinstance(node, Trail):
+        return [] if node.store is None else [node.store]
+    elif isinstance(node, TrailSeries):
+        return [node.mountain, node.following]
+    elif isinstance(node, TrailSplit):
+        return [node.path_top, node.path_bottom, node.path_follow]
+    return []
+
+class TrailIndex:
+    """
+    Maps mountain names and Mountain objects to the TrailSeries holding them,
+    and each series to the Trail whose store it is.
+
+    The index listens for edits (see tracked.add_edit_listener), so assigning the result
+    of an edit method to a trail in the index updates it in time proportional to the
+    nodes added or removed, rather than re-walking the trail.
+    Every node keeps a count of the places referencing it, so subtrees shared between
+    several places (see trail_factory) are handled too.
+    """
+
+    def __init__(self, trail: Trail) -> None:
+        """
+        Indexes the trail.
+
+        :complexity: O(n), where n is the number of nodes in the trail
+        """
+        self.trail = trail
+        # id(node) -> {id(parent) or ROOT: number of references from that parent}
+        self.refs = {}
+        # id(node) -> node, for every indexed node
+        self.nodes = {}
+        # mountain name -> {id(series): series}
+        self.by_name = {}
+        self._link(None, trail)
+        add_edit_listener(self._on_edit)
+
+    def close(self) -> None:
+        """
+        Stops following edits to the trail.
+
+        :complexity: O(l), where l is the number of edit listeners
+        """
+        remove_edit_listener(self._on_edit)
+
+    def __contains__(self, name: str) -> bool:
+        """
+        :complexity: O(1)
+        """
+        return name in self.by_name
+
+    def find(self, name: str) -> list[TrailSeries]:
+        """
+        Returns every series whose mountain has this name.
+
+        :complexity: O(r), where r is the number of results
+        """
+        return list(self.by_name.get(name, {}).values())
+
+    def slots(self, store: TrailStore) -> list[Trail]:
+        """
+        Returns the trails whose store is this series or split.
+
+        :complexity: O(r), where r is the number of results
+        """
+        return [self.nodes[key] for key in self.refs.get(id(store), ()) if key != ROOT]
+
+    def where(self, name: str) -> list[tuple[TrailSeries, Trail]]:
+        """
+        Returns (series, trail) for every series whose mountain has this name,
+        where trail is the Trail whose store is the series.
+
+        :complexity: O(r), where r is the number of results
+        """
+        return [(series, trail) for series in self.find(name) for trail in self.slots(series)]
+
+    def locate(self, mountain: Mountain) -> list[tuple[TrailSeries, Trail]]:
+        """
+        Returns (series, trail) for every series holding this exact Mountain object.
+
+        :complexity: O(r), where r is the number of results
+        """
+        return [
+            (series, trail)
+            for series in (self.nodes[key] for key in self.refs.get(id(mountain), ()))
+            for trail in self.slots(series)
+        ]
+
+    def remove_mountain(self, name: str) -> int:
+        """
+        Removes every mountain with this name from the trail, returning how many were removed.
+
+        The series are found once; the trails holding each one are looked up as it is reached,
+        since removing a series moves the one after it into the removed one's trail.
+
+        :complexity: O(r), where r is the number of mountains removed
+        """
+        removed = 0
+        for series in self.find(name):
+            for trail in self.slots(series):
+                trail.store = series.remove_mountain()
+                removed += 1
+        return removed
+
+    def edit_mountain(self, name: str, mountain: Mountain) -> int:
+        """
+        Replaces every mountain with this name by the given mountain, returning how many were replaced.
+        The first series replaced gets mountain itself and every other one a copy of it,
+        so a later edit to one of them in place does not change the rest.
+
+        :complexity: O(r), where r is the number of mountains replaced
+        """
+        matches = self.find(name)
+        for i, series in enumerate(matches):
+            series.mountain = mountain if i == 0 else Mountain(mountain.name, mountain.difficulty_level, mountain.length)
+        return len(matches)
+
+    def _on_edit(self, node: Node, field: str, old, new) -> None:
+        if id(node) not in self.refs:
+            return
+        if isinstance(node, Mountain):
+            if field == "name":
+                for key in self.refs[id(node)]:
+                    self._rename(self.nodes[key], old, new)
+            return
+        if isinstance(node, TrailSeries) and field == "mountain":
+            self._rename(node, old.name, new.name)
+        # Link first, so nodes kept by the edit are never dropped from the index.
+        if new is not None:
+            self._link(node, new)
+        if old is not None:
+            self._unlink(node, old)
+
+    def _rename(self, series: TrailSeries, old: str, new: str) -> None:
+        named = self.by_name[old]
+        del named[id(series)]
+        if not named:
+            del self.by_name[old]
+        self.by_name.setdefault(new, {})[id(series)] = series
+
+    def _link(self, parent: Node|None, node: Node) -> None:
+        """
+        Adds a reference from parent to node, indexing node and its children if it is new.
+
+        :complexity: O(a), where a is the number of nodes added to the index
+        """
+        stack = [(parent, node)]
+        while stack:
+            parent, node = stack.pop()
+            refs = self.refs.get(id(node))
+            if refs is None:
+                refs = self.refs[id(node)] = {}
+                self.nodes[id(node)] = node
+                if isinstance(node, TrailSeries):
+                    self.by_name.setdefault(node.mountain.name, {})[id(node)] = node
+                stack.extend((node, child) for child in _children(node))
+            key = ROOT if parent is None else id(parent)
+            refs[key] = refs.get(key, 0) + 1
+
+    def _unlink(self, parent: Node, node: Node) -> None:
+        """
+        Drops a reference from parent to node, removing node and its children from the index
+        once nothing references them.
+
+        :complexity: O(r), where r is the number of nodes removed from the index
+        """
+        stack = [(parent, node)]
+        while stack:
+            parent, node = stack.pop()
+            refs = self.refs[id(node)]
+            refs[id(parent)] -= 1
+            if refs[id(parent)] == 0:
+                del refs[id(parent)]
+            if refs:
+                continue
+            del self.refs[id(node)]
+            del self.nodes[id(node)]
+            if isinstance(node, TrailSeries):
+                named = self.by_name[node.mountain.name]
+                del named[id(node)]
+                if not named:
+                    del self.by_name[node.mountain.name]
+            stack.extend((node, child) for child in _children(node))
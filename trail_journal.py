@@ -0,0 +1,575 @@
+"""
+Append-only edit journals for store files.
+
+Next to a store file (the snapshot) sits a journal, path + ".journal", with one JSON line per
+edit made since the snapshot was written. Saving only appends the new edits, and once the
+journal grows long enough it is folded into a new snapshot on a background thread.
+load_journaled reads the snapshot and replays the journal on top of it.
+
+Each record names the edited node by the fields leading to it from the root, for example
+{"path": ["store", "path_top"], "field": "store", "nodes": [...]}. A value that is a trail
+node is written as a flat list of nodes in post-order, the last being the value itself:
+
+    ["T", store]                    a Trail, store being the index of an earlier node or null
+    ["S", mountain, following]      a TrailSeries
+    ["P", top, bottom, follow]      a TrailSplit
+    ["M", name, difficulty, length] a Mountain
+    ["R", path]                     a node that was already in the trail before the edit
+
+so an edit costs a record proportional to the nodes it adds, however much of the trail it keeps.
+Values of mountain fields are written as they are, {"path": [...], "field": "name", "value": "..."}.
+
+A journal starts with a header, {"snapshot": checksum}, naming the snapshot it applies to, so a
+reader can tell a journal that belongs to the snapshot from one left over while it was replaced.
+Only writers (save_journaled and TrailJournal) ever rename or delete files, and only while holding
+the store's lock file; load_journaled just reads.
+
+An edit to a node shared between several places in the trail is journalled once for each place,
+the later records referring to the value written by the first. A store loaded without a factory holds
+a separate copy of the node at each place, and still replays to the trail that was edited.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Any
+
+from mountain import Mountain
+from serialize import load_store, save_store
+from tracked import add_edit_listener, remove_edit_listener
+from trail import Trail, TrailSeries, TrailSplit
+from trail_factory import TrailFactory
+from trail_index import ROOT, Node, TrailIndex
+
+JOURNAL_SUFFIX = ".journal"
+
+def journal_path(path: str) -> str:
+    """Returns the path of the journal kept next to a store file."""
+    return path + JOURNAL_SUFFIX
+
+def _fields_of(parent: Node, child: Node, edit: tuple) -> list[str]:
+    """Returns the names of the fields of parent holding child, before the edit (node, field, old value)."""
+    node, edited, old = edit
+    fields = [
+        field for field in parent.TRACKED_FIELDS
+        if (old if parent is node and field == edited else parent.__dict__.get(field)) is child
+    ]
+    if not fields:
+        raise ValueError("Invalid trail path")
+    return fields
+
+def _resolve(trail: Trail, path: list[str]) -> Node:
+    node = trail
+    for field in path:
+        node = getattr(node, field)
+    return node
+
+def _decode(trail: Trail, nodes: list) -> Any:
+    """Builds the value of a record from its flat node list, resolving references against trail."""
+    built = []
+    for node in nodes:
+        tag, args = node[0], node[1:]
+        if tag == "R":
+            built.append(_resolve(trail, args[0]))
+        elif tag == "M":
+            built.append(Mountain(*args))
+        else:
+            children = [None if arg is None else built[arg] for arg in args]
+            if tag == "T":
+                built.append(Trail(*children))
+            elif tag == "S":
+                built.append(TrailSeries(*children))
+            elif tag == "P":
+                built.append(TrailSplit(*children))
+            else:
+                raise ValueError("Invalid journal record")
+    return built[-1]
+
+def replay(trail: Trail, lines) -> int:
+    """
+    Applies journal records (lines of a journal file) to the trail, in order,
+    returning how many were applied. Headers are skipped.
+
+    :raises ValueError: if a record does not fit the trail
+
+    :complexity: O(r), where r is the total size of the records
+    """
+    applied = 0
+    for line in lines:
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if "snapshot" in record:
+                continue
+            # References are resolved before the edit, as they were recorded.
+            value = _decode(trail, record["nodes"]) if "nodes" in record else record["value"]
+            setattr(_resolve(trail, record["path"]), record["field"], value)
+        except (AttributeError, IndexError, KeyError, TypeError) as e:
+            raise ValueError("Invalid journal record") from e
+        applied += 1
+    return applied
+
+# A lock file older than this is taken to be left by a process that died, where its owner cannot be checked.
+STALE_LOCK_SECONDS = 600
+
+def _compaction_paths(path: str) -> tuple[str, str, str]:
+    """
+    Returns where a compaction writes the new snapshot and journal before they replace the old ones,
+    and the lock file held meanwhile.
+    """
+    directory, name = os.path.split(path)
+    # Keep the store's extensions, so save_store picks the same format and codec.
+    snapshot_tmp = os.path.join(directory, ".compacting." + name)
+    return snapshot_tmp, journal_path(path) + ".next", snapshot_tmp + ".lock"
+
+def _checksum(path: str) -> str:
+    """
+    Returns the checksum of a snapshot file, as written in journal headers.
+
+    :complexity: O(n), where n is the size of the file
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def _header(checksum: str) -> str:
+    return json.dumps({"snapshot": checksum}) + "\n"
+
+def _read_journal(path: str) -> tuple[str|None, list[str]]|None:
+    """
+    Returns the checksum in a journal's header (None if it has none, as journals written before
+    headers were added) and its complete records, or None if there is no such file.
+    A record still being appended, with no newline yet, is left out.
+
+    :complexity: O(r), where r is the size of the journal
+    """
+    try:
+        with open(path, "r") as f:
+            lines = f.readlines()
+    except FileNotFoundError:
+        return None
+    if lines and not lines[-1].endswith("\n"):
+        lines.pop()
+    checksum = None
+    if lines and lines[0].startswith('{"snapshot"'):
+        checksum = json.loads(lines[0])["snapshot"]
+        lines = lines[1:]
+    return checksum, [line for line in lines if line.strip()]
+
+def _lock_is_live(lock: str) -> bool:
+    """Returns whether the process that wrote a lock file may still be holding it."""
+    try:
+        age = time.time() - os.path.getmtime(lock)
+        with open(lock, "r") as f:
+            pid = int(f.read())
+    except FileNotFoundError:
+        return False
+    except ValueError:
+        # Still being written, unless its writer died first.
+        return age < STALE_LOCK_SECONDS
+    if pid == os.getpid():
+        return True
+    if os.name != "posix":
+        return age < STALE_LOCK_SECONDS
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def _lock(path: str, timeout: float = 0) -> bool:
+    """
+    Takes the lock file of a store, waiting up to timeout seconds for its holder, and returns
+    whether it was taken. A lock left by a process that has died is taken over.
+    """
+    lock = _compaction_paths(path)[2]
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            fd = os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            if not _lock_is_live(lock):
+                try:
+                    os.remove(lock)
+                except FileNotFoundError:
+                    pass
+                continue
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.01)
+            continue
+        with os.fdopen(fd, "w") as f:
+            f.write(str(os.getpid()))
+        return True
+
+def _unlock(path: str) -> None:
+    os.remove(_compaction_paths(path)[2])
+
+def _settle(path: str) -> None:
+    """
+    Finishes or rolls back a compaction that stopped part way (see TrailJournal.compact).
+    The store's lock must be held.
+
+    :complexity: O(n), where n is the size of the store
+    """
+    snapshot_tmp, journal_next, _ = _compaction_paths(path)
+    if os.path.exists(journal_next):
+        journal = _read_journal(journal_next)
+        if journal[0] is not None and os.path.exists(path) and journal[0] == _checksum(path):
+            # The snapshot was replaced, so the new journal is the one that applies.
+            os.replace(journal_next, journal_path(path))
+        else:
+            os.remove(journal_next)
+    if os.path.exists(snapshot_tmp):
+        os.remove(snapshot_tmp)
+
+def _recover(path: str) -> None:
+    """
+    Settles a compaction that was interrupted, unless another writer holds the store's lock.
+
+    :complexity: O(n), where n is the size of the store
+    """
+    if _lock(path):
+        try:
+            _settle(path)
+        finally:
+            _unlock(path)
+
+def _current_journal(path: str, checksum: str) -> list[str]|None:
+    """
+    Returns the records of the journal that applies to the snapshot with the given checksum,
+    or None if neither journal does yet (the snapshot was just replaced).
+    """
+    journal = _read_journal(_compaction_paths(path)[1])
+    if journal is not None and journal[0] == checksum:
+        return journal[1]
+    journal = _read_journal(journal_path(path))
+    if journal is None:
+        return []
+    if journal[0] is None or journal[0] == checksum:
+        return journal[1]
+    return None
+
+def load_journaled(path: str, factory: TrailFactory|None = None, lazy: bool = False, timeout: float = 5) -> Trail:
+    """
+    Loads a store file (see serialize.load_store) and replays its journal, if it has one.
+
+    Files are only read, so this is safe while another thread or process compacts the store.
+    If the snapshot is replaced while it is being read, it is read again, for up to timeout seconds.
+    A journal that does not fit a snapshot left unchanged meanwhile (as after the snapshot was
+    replaced by save_store, or by hand) is reported at once.
+
+    :raises ValueError: if the file is not a trail, or the journal does not fit it
+
+    :complexity: O(n + r), where n is the size of the store and r the size of the journal
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        before = os.stat(path)
+        records = _current_journal(path, _checksum(path))
+        if records is not None:
+            trail = load_store(path, factory, lazy)
+        after = os.stat(path)
+        unchanged = (before.st_ino, before.st_size, before.st_mtime_ns) == (after.st_ino, after.st_size, after.st_mtime_ns)
+        if unchanged:
+            if records is None:
+                # Compactions replace the snapshot before the journal, so this journal will never fit it.
+                raise ValueError("Journal does not fit its store")
+            replay(trail, records)
+            return trail
+        if time.monotonic() >= deadline:
+            raise ValueError("Journal does not fit its store")
+        time.sleep(0.01)
+
+def _write_snapshot(path: str, trail: Trail) -> str:
+    """
+    Saves the trail beside a store, as its next snapshot, returning the snapshot's checksum.
+    The store's lock must be held.
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    snapshot_tmp = _compaction_paths(path)[0]
+    save_store(trail, snapshot_tmp)
+    return _checksum(snapshot_tmp)
+
+def _replace_snapshot(path: str, checksum: str, rest: bytes = b"") -> None:
+    """
+    Replaces a store's snapshot with the one written by _write_snapshot and its journal with one
+    holding rest. The journal is written beside the store first and the snapshot is replaced first,
+    so readers always find a snapshot and a journal that fits it. The store's lock must be held.
+
+    :complexity: O(r), where r is the size of rest
+    """
+    snapshot_tmp, journal_next, _ = _compaction_paths(path)
+    with open(journal_next, "wb") as f:
+        f.write(_header(checksum).encode())
+        f.write(rest)
+    os.replace(snapshot_tmp, path)
+    os.replace(journal_next, journal_path(path))
+
+def save_journaled(trail: Trail, path: str, timeout: float = 60) -> None:
+    """
+    Saves the whole trail as the snapshot of a store file (see serialize.save_store),
+    emptying its journal. Waits up to timeout seconds for a compaction of the store to finish.
+
+    :raises TimeoutError: if the store is still being compacted
+
+    :complexity: O(n), where n is the number of nodes in the trail
+    """
+    if not _lock(path, timeout):
+        raise TimeoutError(f"{path} is being compacted")
+    try:
+        _settle(path)
+        _replace_snapshot(path, _write_snapshot(path, trail))
+    except BaseException:
+        _settle(path)
+        raise
+    finally:
+        _unlock(path)
+
+class TrailJournal:
+    """
+    Records every edit to a trail, so save appends them to the journal of its store file.
+
+    The trail must have been loaded from path with load_journaled (or just saved there
+    with save_store), so the snapshot and journal describe it.
+    """
+
+    def __init__(self, trail: Trail, path: str, compact_after: int = 1000) -> None:
+        """
+        Starts recording edits. The journal is compacted once it holds more than compact_after records.
+
+        :complexity: O(n), where n is the number of nodes in the trail
+        """
+        self.trail = trail
+        self.path = path
+        self.compact_after = compact_after
+        # Records not yet saved.
+        self.pending = []
+        self._lock = threading.Lock()
+        self._compaction = None
+        # The exception a background compaction failed with, raised by the next save.
+        self._error = None
+        _recover(path)
+        self.records = self._count_records()
+        # Listen before the index does, so it still describes the trail as it was before each edit.
+        add_edit_listener(self._on_edit)
+        self.index = TrailIndex(trail)
+
+    def _count_records(self) -> int:
+        """
+        Returns the number of records in the journal. A journal that is empty, or whose header
+        names another snapshot (left over after the snapshot was replaced by save_store, or by hand),
+        is started afresh with a header naming the current one.
+
+        :complexity: O(n + r), where n is the size of the store and r the size of the journal
+        """
+        checksum = _checksum(self.path)
+        journal = _read_journal(journal_path(self.path))
+        if journal is not None and (journal[0] == checksum or journal[0] is None and journal[1]):
+            return len(journal[1])
+        with open(journal_path(self.path), "w") as f:
+            f.write(_header(checksum))
+        return 0
+
+    def close(self) -> None:
+        """
+        Stops recording edits, waiting for any compaction to finish. Unsaved edits are dropped.
+
+        :complexity: O(l), where l is the number of edit listeners
+        """
+        remove_edit_listener(self._on_edit)
+        self.index.close()
+        self.wait()
+
+    def save(self) -> None:
+        """
+        Appends the edits made since the last save to the journal, and starts a compaction
+        in the background if the journal has grown past compact_after records.
+
+        :raises Exception: whatever the last compaction failed with, if it did. The compaction is
+                           rolled back (or finished) first, and the edits are kept for the next save.
+
+        :complexity: O(e), where e is the size of the new records
+        """
+        with self._lock:
+            error, self._error = self._error, None
+            if error is not None:
+                _recover(self.path)
+                self.records = self._count_records()
+                raise error
+            if self.pending:
+                with open(journal_path(self.path), "a") as f:
+                    f.writelines(self.pending)
+                self.records += len(self.pending)
+                self.pending.clear()
+            compact = self.records > self.compact_after and self._compaction is None
+        if compact:
+            self.compact()
+
+    def compact(self, wait: bool = False) -> None:
+        """
+        Folds the saved journal into a new snapshot on a background thread (or this one, if wait).
+
+        The new snapshot is built from the files alone, so the trail can be edited and saved
+        meanwhile. It is written beside the store first; the records saved since then are moved
+        to a new journal, headed by the new snapshot's checksum, and the two replace the old files.
+        The store's lock file is held throughout, and the compaction is skipped if another process
+        holds it. A compaction that was interrupted part way is finished or undone by the next
+        writer to take the lock. If the compaction fails, the next save raises its exception.
+
+        :complexity: O(n + r) on the compacting thread, where n is the size of the store and r the size of the journal
+        """
+        self.wait()
+        self._compaction = threading.Thread(target=self._compact, daemon=True)
+        self._compaction.start()
+        if wait:
+            self.wait()
+
+    def wait(self) -> None:
+        """Waits for a running compaction to finish."""
+        compaction = self._compaction
+        if compaction is not None:
+            compaction.join()
+
+    def _compact(self) -> None:
+        try:
+            if not _lock(self.path):
+                # Another process is compacting; a later save will try again.
+                return
+            try:
+                with self._lock:
+                    offset = os.path.getsize(journal_path(self.path))
+                trail = load_store(self.path)
+                with open(journal_path(self.path), "rb") as f:
+                    applied = replay(trail, f.read(offset).decode().splitlines())
+                checksum = _write_snapshot(self.path, trail)
+                with self._lock:
+                    with open(journal_path(self.path), "rb") as f:
+                        f.seek(offset)
+                        rest = f.read()
+                    _replace_snapshot(self.path, checksum, rest)
+                    self.records -= applied
+            except BaseException:
+                # Settle before saves can append again, so they go to the journal that applies.
+                with self._lock:
+                    _settle(self.path)
+                raise
+            finally:
+                _unlock(self.path)
+        except Exception as e:
+            self._error = e
+        finally:
+            self._compaction = None
+
+    def _on_edit(self, node: Node, field: str, old, new) -> None:
+        if id(node) not in self.index.refs:
+            return
+        edit = (node, field, old)
+        first, *others = self._paths(node, edit)
+        record = {"path": first, "field": field}
+        if isinstance(new, (Trail, TrailSeries, TrailSplit, Mountain)):
+            record["nodes"] = self._encode(new, edit)
+            # The other places refer to the value the first record puts in place.
+            shared = [["R", first + [field]]]
+        else:
+            record["value"] = new
+        self.pending.append(json.dumps(record) + "\n")
+        for path in others:
+            record["path"] = path
+            if "nodes" in record:
+                record["nodes"] = shared
+            self.pending.append(json.dumps(record) + "\n")
+
+    def _path(self, node: Node, edit: tuple) -> list[str]:
+        """
+        Returns the fields leading from the root to one of the places node sits in the trail,
+        before the edit (node, field, old value) the index has not seen yet.
+
+        :complexity: O(d), where d is the depth of node
+        """
+        fields = []
+        while True:
+            parent = next(iter(self.index.refs[id(node)]))
+            if parent == ROOT:
+                break
+            parent = self.index.nodes[parent]
+            fields.append(_fields_of(parent, node, edit)[0])
+            node = parent
+        fields.reverse()
+        return fields
+
+    def _paths(self, node: Node, edit: tuple) -> list[list[str]]:
+        """
+        Returns the fields leading from the root to every place node sits in the trail,
+        before the edit (node, field, old value) the index has not seen yet.
+
+        :complexity: O(p*d), where p is the number of places and d the depth of node
+        """
+        paths = []
+        # Each entry is a node and the fields below it, as linked (field, rest) tuples.
+        stack = [(node, None)]
+        while stack:
+            node, below = stack.pop()
+            for parent in self.index.refs[id(node)]:
+                if parent == ROOT:
+                    fields, rest = [], below
+                    while rest is not None:
+                        field, rest = rest
+                        fields.append(field)
+                    paths.append(fields)
+                    continue
+                parent = self.index.nodes[parent]
+                for field in _fields_of(parent, node, edit):
+                    stack.append((parent, (field, below)))
+        return paths
+
+    def _encode(self, value: Node, edit: tuple) -> list:
+        """
+        Flattens a new value into a post-order node list, referring to nodes already in the trail by path.
+
+        :complexity: O(a + d), where a is the number of nodes added and d the depth of the nodes referred to
+        """
+        nodes = []
+        # id(node) -> index in nodes
+        index = {}
+        stack = [value]
+        while stack:
+            node = stack[-1]
+            if id(node) in index:
+                stack.pop()
+                continue
+            if id(node) in self.index.refs:
+                stack.pop()
+                index[id(node)] = len(nodes)
+                nodes.append(["R", self._path(node, edit)])
+                continue
+            if isinstance(node, Mountain):
+                stack.pop()
+                index[id(node)] = len(nodes)
+                nodes.append(["M", node.name, node.difficulty_level, node.length])
+                continue
+            if isinstance(node, Trail):
+                tag, children = "T", [node.store]
+            elif isinstance(node, TrailSeries):
+                tag, children = "S", [node.mountain, node.following]
+            elif isinstance(node, TrailSplit):
+                tag, children = "P", [node.path_top, node.path_bottom, node.path_follow]
+            else:
+                raise ValueError("Invalid TrailStore")
+            missing = [child for child in children if child is not None and id(child) not in index]
+            if missing:
+                stack.extend(missing)
+                continue
+            stack.pop()
+            index[id(node)] = len(nodes)
+            nodes.append([tag] + [None if child is None else index[id(child)] for child in children])
+        return nodes
@@ -0,0 +1,93 @@
+"""
+Monte Carlo simulation of many random walkers at once.
+
+Rather than sending walkers through Trail.follow_path one at a time, the walkers are
+kept as an array of indices and moved through the compiled trail in groups: every walker
+in a group is at the same node, and each split divides its group into top and bottom with
+one vectorised draw. Both groups then rejoin for the split's following trail.
+
+Requires NumPy, which is imported on first use so the rest of the package works without it.
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
+
+from compiled_trail import compile_trail, EMPTY, SERIES
+from mountain import Mountain
+from personality import RandomWalker
+from trail import Trail
+
+if TYPE_CHECKING:
+    import numpy as np
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("walk_simulation requires NumPy (pip install numpy)") from e
+    return numpy
+
+@dataclass
+class WalkSimulation:
+    """
+    Results of a simulation.
+
+    visits[i] is the number of times a walker climbed mountains[i].
+    path_lengths[k] is the number of walkers whose path had k mountains.
+    """
+
+    mountains: list[Mountain]
+    visits: np.ndarray
+    path_lengths: np.ndarray
+
+    def visit_counts(self) -> list[tuple[Mountain, int]]:
+        """
+        Returns (mountain, visits) for every mountain on the trail, most visited first.
+
+        :complexity: O(m*log(m)), where m is the number of distinct mountains
+        """
+        order = sorted(range(len(self.mountains)), key=lambda i: -self.visits[i])
+        return [(self.mountains[i], int(self.visits[i])) for i in order]
+
+def simulate_walks(trail: Trail, walkers: int, personality: RandomWalker|None = None, seed=None) -> WalkSimulation:
+    """
+    Sends a number of walkers along the trail, each choosing branches as the personality would,
+    with its top_probability at every split (RandomWalker() if not given).
+    seed is passed to numpy.random.default_rng; the personality's own rng is not used.
+
+    :raises ImportError: if NumPy is not installed
+
+    :complexity: O(g*w), where g is the number of distinct walker groups (at most the number of nodes
+                 walked by follow_path over every route) and w the walkers in a group
+    """
+    np = _numpy()
+    if personality is None:
+        personality = RandomWalker()
+    compiled = compile_trail(trail)
+    kind, mountain, following = compiled.kind, compiled.mountain, compiled.following
+    path_top, path_bottom, path_follow = compiled.path_top, compiled.path_bottom, compiled.path_follow
+    p_top = {node: personality.top_probability(*branches) for node, branches in compiled.branch_trails.items()}
+    rng = np.random.default_rng(seed)
+
+    visits = np.zeros(len(compiled.mountains), dtype=np.int64)
+    lengths = np.zeros(walkers, dtype=np.int64)
+    stack = [(compiled.root, np.arange(walkers))]
+    while stack:
+        node, group = stack.pop()
+        run = 0
+        while node != EMPTY and kind[node] == SERIES:
+            visits[mountain[node]] += len(group)
+            run += 1
+            node = following[node]
+        if run:
+            lengths[group] += run
+        if node == EMPTY:
+            continue
+        top = rng.random(len(group)) < p_top[node]
+        stack.append((path_follow[node], group))
+        for branch, members in ((path_bottom[node], group[~top]), (path_top[node], group[top])):
+            if len(members):
+                stack.append((branch, members))
+
+    return WalkSimulation(compiled.mountains, visits, np.bincount(lengths, minlength=1))